@@ -1,15 +1,21 @@
 from favorites import Favorites
 from game import Game
-from gameinfo import GameInfo
+from errors import GameInfoError, APIRequestError, InvalidAPIKeyError
+from metrics import metrics
 from enum import Enum
 from tabulate import tabulate
-import webbrowser
+from functools import partial
+import math
 import sys
 import os
 
 class MenuTable:
     """menu tables to use in tabulate """
 
+    # rendered tables by content, so static menus are formatted only once
+    _rendered: dict[tuple, str] = {}
+    _max_rendered = 256
+
     # static menus    
     mainmenu = [
         ["1", "search game"],
@@ -39,13 +45,24 @@ class MenuTable:
         ["3", "back"]
     ]
 
+    @classmethod
+    def render(cls, menutable: list, header: str="", tablefmt: str="outline") -> str:
+        """returns the table formatted by tabulate. Small tables only: the whole content is the cache key"""
+        key = (tuple(tuple(row) for row in menutable), header, tablefmt)
+        text = cls._rendered.get(key)
+        if text is None:
+            if len(cls._rendered) >= cls._max_rendered:
+                cls._rendered.clear()
+            text = cls._rendered[key] = tabulate(menutable, headers=header, tablefmt=tablefmt)
+        return text
+
     # dynamic menus
     @staticmethod
-    def get_from_list(gamelist: list[Game]) -> list[list[str]]:
-        """returns a table list to use in tabulate, similar to the static menus"""
+    def get_from_list(gamelist: list[Game], start: int = 0) -> list[list[str]]:
+        """returns a table list to use in tabulate, similar to the static menus. Ids are numbered from start + 1"""
         
         
-        menu = [[i + 1, game.released, game.name, game.metacritic] for i, game in enumerate(gamelist)]
+        menu = [[i, game.released, game.name, game.metacritic] for i, game in enumerate(gamelist, start=start + 1)]
 
         # first row as header
         menu.insert(0, ["id", "Release date", "Name", "Metacritic"])
@@ -80,6 +97,10 @@ class UI:
             ui.show_context()
 
     """
+
+    # rows shown per page of a list of games
+    page_size = 20
+
     def __init__(self, context = Context.MAINMENU):
         self._current_context = context
         self._previous_context = Context.MAINMENU
@@ -94,6 +115,17 @@ class UI:
             Context.QUIT: self.quit
         }
 
+        # long lists are shown one page at a time
+        self._page = 0
+
+        # rendered pages of the lists: (list name, version of the list, first row) -> text
+        self._rendered_pages: dict[tuple, str] = {}
+        self._game_list_version = 0
+
+        if os.name == "nt":
+            # enables ANSI escape codes in the Windows console, used to clear it
+            os.system("")
+
         # maange the favorites list in favorites.favorites. Also manage import and export favorites.
         self._favorites: Favorites = Favorites()
 
@@ -103,26 +135,62 @@ class UI:
         # when in context GAME_LIST, the game you select will be saved in this attribute to be shown in context GAME_SELECTED
         self._game_selected: Game = None
 
-        # class to manage api requests
-        self._game_info = GameInfo()
+        # class to manage api requests, created on the first search. Responses are cached on disk between runs
+        self._game_info = None
+
+        # the active search, (GameInfo method, arguments), and its page shown in context GAME_LIST
+        self._search: tuple[str, dict] = None
+        self._search_page = 1
+
+        # background workers, started on first use: next page of results and background images
+        self._prefetcher = None
+        self._images = None
 
     
     @property
     def favorites(self):
         return self._favorites
 
+    @property
+    def game_info(self):
+        # requests, dotenv and the e.env file are only loaded when the first search is made
+        if self._game_info is None:
+            from gameinfo import GameInfo
+            from cache import ResponseCache
+            self._game_info = GameInfo(cache=ResponseCache())
+        return self._game_info
+
+    @property
+    def prefetcher(self):
+        if self._prefetcher is None:
+            from prefetch import Prefetcher
+            self._prefetcher = Prefetcher()
+        return self._prefetcher
+
+    @property
+    def images(self):
+        if self._images is None:
+            from prefetch import ImageCache
+            self._images = ImageCache()
+        return self._images
+
     def show_context(self):
         """shows the current context"""
-        self._clear_console()
+        metrics.incr("ui_redraws_total", context=self._current_context.value)
+        with metrics.timer("ui_clear_seconds"):
+            self._clear_console()
         self._contexts[self._current_context]()
     
     def _clear_console(self):
-        if os.name == "nt":
-            _ = os.system("cls")
-        else:
-            _ = os.system("clear")
+        # escape codes instead of a cls/clear child process on every redraw
+        sys.stdout.write("\033[2J\033[H")
+        sys.stdout.flush()
 
     def _update_context(self, new_context: Context, explicit_previous_context: Context = None):
+        # a list starts at its first page, unless we come back to it from one of its games
+        if new_context in (Context.FAVORITES, Context.GAME_LIST) and self._current_context != Context.GAME_SELECTED:
+            self._page = 0
+
         if not explicit_previous_context:
             self._previous_context = self._current_context
         else:
@@ -130,11 +198,61 @@ class UI:
         self._current_context = new_context
 
     def _print_header(self, header: str):
-        print("")    
-        print(tabulate([["", "", "", header, ""]], tablefmt="plain"))
+        with metrics.timer("ui_render_seconds"):
+            print("")    
+            print(MenuTable.render([["", "", "", header, ""]], tablefmt="plain"))
     
     def _print_menu(self, menutable: list, header: str="", tablefmt: str="outline"):
-        print(tabulate(menutable, headers=header, tablefmt=tablefmt))
+        with metrics.timer("ui_render_seconds"):
+            print(MenuTable.render(menutable, header=header, tablefmt=tablefmt))
+
+    def _print_game_page(self, name: str, version: int, count: int, window):
+        """
+        prints the current page of a list of games. Pages are rendered once per version of the list.
+
+        :param name: name of the list
+        :param version: changes every time the list changes
+        :param count: number of games in the list
+        :param window: function returning the games between two positions of the list
+        """
+        with metrics.timer("ui_render_seconds"):
+            pages = max(1, math.ceil(count / self.page_size))
+            self._page = min(self._page, pages - 1)
+            start = self._page * self.page_size
+
+            key = (name, version, start)
+            text = self._rendered_pages.get(key)
+            if text is None:
+                # pages of older versions are never shown again
+                self._rendered_pages = {k: v for k, v in self._rendered_pages.items() if k[:2] == key[:2]}
+                table = MenuTable.get_from_list(window(start, start + self.page_size), start)
+                text = self._rendered_pages[key] = tabulate(table, headers="firstrow", tablefmt="outline")
+
+            print(text)
+            if pages > 1:
+                print(f"page {self._page + 1}/{pages} (n: next, p: previous)")
+
+    def _load_list_options(self, count: int, window, next_page=None, previous_page=None):
+        """
+        waits for a game id to select, 0 to go back or n/p to move between pages.
+        next_page and previous_page are called when moving past the last or the first page
+        """
+        opt = input("game id to select: (0 to go back): ").strip()
+        last_page = max(0, math.ceil(count / self.page_size) - 1)
+        if opt == "0":
+            self._update_context(self._previous_context, explicit_previous_context=Context.MAINMENU)
+        elif opt == "n":
+            if self._page < last_page:
+                self._page += 1
+            elif next_page:
+                next_page()
+        elif opt == "p":
+            if self._page > 0:
+                self._page -= 1
+            elif previous_page:
+                previous_page()
+        elif opt.isdigit() and 1 <= int(opt) <= count:
+            self._select_game(window(int(opt) - 1, int(opt))[0])
 
     def _load_options(self, options: dict, label: str="option: "):
         opt = input(label).strip()
@@ -176,25 +294,31 @@ class UI:
     def my_favorites(self):
         # prints the menu
         self._print_header("favorites")
-        self._print_menu(MenuTable.get_from_list(self.favorites.favorites), header="firstrow")
-
-        # implementar opciones
+        self._print_game_page("favorites", self.favorites.version, len(self.favorites), self.favorites.window)
 
-        options = {str(i + 1): lambda game=game: self._select_game(game) for i, game in enumerate(self.favorites.favorites)}
-        options["0"] = lambda: self._update_context(self._previous_context, explicit_previous_context=Context.MAINMENU)
-        self._load_options(options, label="game id to select: (0 to go back): ")
+        self._load_list_options(len(self.favorites), self.favorites.window)
 
     def game_list(self):
         # prints the menu
-        self._print_header("results...")
-        self._print_menu(MenuTable.get_from_list(self._game_list), header="firstrow")
-
-        # implementar opciones
-
-        options = {str(i + 1): lambda game=game: self._select_game(game) for i, game in enumerate(self._game_list)}
-        options["0"] = lambda: self._update_context(self._previous_context, explicit_previous_context=Context.MAINMENU)
-
-        self._load_options(options, label="game id to select: (0 to go back): ")
+        paginated = self._search and self._search[0] != "search_by_name"
+        self._print_header(f"results... page {self._search_page}" if paginated else "results...")
+        self._print_game_page("game_list", self._game_list_version, len(self._game_list), self._game_list_window)
+        if paginated:
+            print("n: next page, p: previous page")
+
+        # download the images of the games shown while the user chooses one
+        start = self._page * self.page_size
+        self.images.prefetch([game.background_url for game in self._game_list_window(start, start + self.page_size)])
+
+        self._load_list_options(
+            len(self._game_list),
+            self._game_list_window,
+            next_page=lambda: paginated and self._load_search_page(self._search_page + 1),
+            previous_page=lambda: paginated and self._search_page > 1 and self._load_search_page(self._search_page - 1)
+        )
+
+    def _game_list_window(self, start: int, stop: int) -> list[Game]:
+        return self._game_list[start:stop]
 
     def game_selected(self):
         game_table = MenuTable.get_from_list([self._game_selected])
@@ -221,8 +345,8 @@ class UI:
     def import_favorites(self):
         self._print_menu([["filename:", self.favorites.filename]], tablefmt="simple")
         try:
-            self.favorites.import_json()
-            self._print_menu([[":)", "file imported successfully"]], tablefmt="simple")
+            stats = self.favorites.import_json()
+            self._print_menu([[":)", f"file imported successfully ({stats.games} games, {stats.rate:.0f} games/sec)"]], tablefmt="simple")
             self._print_menu([["0", "back"]], tablefmt="simple")
             self._load_options({
                 "0": lambda: self._update_context(self._previous_context, Context.MAINMENU)
@@ -238,9 +362,9 @@ class UI:
 
     def export_favorites(self):
         if self.favorites.favorites:
-            self.favorites.export_json()
+            stats = self.favorites.export_json()
             self._print_menu([["filename:", self.favorites.filename]], tablefmt="simple")
-            self._print_menu([[":)", "file exported successfully"]], tablefmt="simple")
+            self._print_menu([[":)", f"file exported successfully ({stats.games} games, {stats.rate:.0f} games/sec)"]], tablefmt="simple")
             self._print_menu([["0", "back"]], tablefmt="simple")
             self._load_options({
                 "0": lambda: self._update_context(self._previous_context, Context.MAINMENU)
@@ -254,6 +378,10 @@ class UI:
 
     def quit(self):
         print("\nSaliendo...")
+        if self._prefetcher:
+            self._prefetcher.shutdown()
+        if self._images:
+            self._images.shutdown()
         sys.exit(0)
     
     def _select_game(self, game: Game):
@@ -262,7 +390,12 @@ class UI:
 
     def _open_image(self, url):
         if url:
-            webbrowser.open(url)
+            import webbrowser
+            from pathlib import Path
+
+            # the prefetched copy opens without waiting for the network
+            path = self.images.get(url)
+            webbrowser.open(Path(path).absolute().as_uri() if path else url)
 
     def _add_to_favorites(self):
         self.favorites.add(self._game_selected)
@@ -280,13 +413,7 @@ class UI:
 
     def _search_by_name(self):
         name = input("name: ").strip()
-        try:            
-            games = self._game_info.search_by_name(name)        
-        except SystemExit:
-            sys.exit("HTTPError. Probably missing a valid API KEY. please read README.md for requirements")
-
-        self._populate_game_list(games)        
-        self._update_context(Context.GAME_LIST)
+        self._run_search("search_by_name", name=name)
 
     def _search_by_metacritic(self):
         while True:
@@ -299,23 +426,11 @@ class UI:
             except ValueError:
                 continue
 
-        try:
-            games = self._game_info.search_by_metacritic(score=(min,max))
-        except SystemExit:
-            sys.exit("HTTPError. Probably missing a valid API KEY. please read README.md for requirements")
-
-        self._populate_game_list(games)        
-        self._update_context(Context.GAME_LIST)
+        self._run_search("search_by_metacritic", score=(min,max))
 
     def _search_by_genre(self):
         genre = input("genre: ").strip()
-        try:
-            games = self._game_info.search_by_genre(genre)
-        except SystemExit:
-            sys.exit("HTTPError. Probably missing a valid API KEY. please read README.md for requirements")
-
-        self._populate_game_list(games)        
-        self._update_context(Context.GAME_LIST)
+        self._run_search("search_by_genre", genre=genre)
 
     def _search_by_dates(self):
         while True:
@@ -330,25 +445,76 @@ class UI:
             except ValueError:
                 continue
         
+        self._run_search("search_by_dates", dates=(min, max))
+
+
+    def _run_search(self, method: str, **kwargs):
+        """runs the search method of GameInfo and shows its first page of results"""
+        self._search = (method, kwargs)
+        if self._load_search_page(1):
+            self._update_context(Context.GAME_LIST)
+
+    def _load_search_page(self, page: int) -> bool:
+        """
+        loads a page of results of the active search, prefetched when possible,
+        and starts prefetching the following one. Returns False if there was nothing to load
+        """
+        from gameinfo import MAX_PAGE
+
+        method, kwargs = self._search
+        # the api refuses the pages after MAX_PAGE
+        if page > MAX_PAGE:
+            return False
         try:
-            games = self._game_info.search_by_dates(dates=(min, max))
-        except SystemExit:
-            sys.exit("HTTPError. Probably missing a valid API KEY. please read README.md for requirements")
-            
-        self._populate_game_list(games)        
-        self._update_context(Context.GAME_LIST)
-
+            games = self.prefetcher.result(self._search_key(page), self._search_call(page))
+        except ValueError:
+            # page number out of range
+            if page > 1:
+                return False
+            raise
+        except InvalidAPIKeyError:
+            sys.exit("Invalid API KEY. please read README.md for requirements")
+        except APIRequestError as e:
+            # past the last page
+            if e.status == 404 and page > 1:
+                return False
+            self._search_failed(e)
+            return False
+        except GameInfoError as e:
+            self._search_failed(e)
+            return False
+
+        if page > 1 and not games:
+            return False
+        self._populate_game_list(games)
+        self._search_page = page
+
+        # the user will probably look at the next page: fetch it while they read this one
+        if method != "search_by_name" and len(games) == self.page_size and page < MAX_PAGE:
+            self.prefetcher.submit(self._search_key(page + 1), self._search_call(page + 1))
+        return True
+
+    def _search_key(self, page: int) -> tuple:
+        method, kwargs = self._search
+        return (method, tuple(sorted(kwargs.items())), page)
+
+    def _search_call(self, page: int) -> partial:
+        """returns the request of a page of the active search, ready to call"""
+        method, kwargs = self._search
+        search = getattr(self.game_info, method)
+        if method == "search_by_name":
+            # the search by name has a single page
+            return partial(search, **kwargs)
+        return partial(search, **kwargs, page=page)
+
+    def _search_failed(self, error: GameInfoError):
+        # the search can be tried again, stay in the search menu
+        self._print_menu([[":(", f"search failed ({error}). try again later"]], tablefmt="simple")
+        input("press enter to continue")
 
     def _populate_game_list(self, games: list[dict]):
         if games:
-            self._game_list.clear()
-            for game in games:
-                self._game_list.append(
-                    Game(
-                        game["name"],
-                        game["released"],
-                        game["genres"],
-                        game["metacritic"],
-                        game["background_image"]
-                    )
-                )
\ No newline at end of file
+            with metrics.timer("ui_populate_seconds"):
+                self._game_list[:] = Game.from_api_many(games)
+            self._game_list_version += 1
+            self._page = 0
\ No newline at end of file
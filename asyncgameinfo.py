@@ -0,0 +1,94 @@
+import asyncio
+import math
+from gameinfo import GameInfo, PAGE_SIZE, MAX_PAGE
+
+class AsyncGameInfo:
+    """
+    asyncio counterpart of GameInfo. Requests run on the pooled session of a GameInfo object
+    in worker threads, at most ``concurrency`` at a time. The rate limit is the one shared by every
+    GameInfo of the process, set with GameInfo.set_rate_limit.
+
+    Usage example:
+        client = AsyncGameInfo(concurrency=8)
+        games = client.fetch_all_pages("search_by_genre", "action")
+
+    """
+
+    # methods that accept a page number, and the GameInfo method building their payload
+    _paginated = {
+        "search_by_metacritic": "_metacritic_payload",
+        "search_by_genre": "_genre_payload",
+        "search_by_dates": "_dates_payload"
+    }
+
+    def __init__(self, game_info: GameInfo = None, concurrency: int = 8):
+        """
+        :param game_info: client used for the requests. Defaults to a new GameInfo with a connection pool of size ``concurrency``
+        :type game_info: GameInfo
+        :param concurrency: maximum requests in flight. Defaults to ``8``
+        :type concurrency: int
+
+        """
+        self._game_info = game_info if game_info else GameInfo(pool_size=concurrency)
+        self._concurrency = concurrency
+
+    @property
+    def game_info(self):
+        return self._game_info
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    async def _fetch(self, payload: dict, semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            return await asyncio.to_thread(self.game_info._fetch, payload)
+
+    async def search_by_name(self, name: str) -> list[dict]:
+        payload = self.game_info._name_payload(name)
+        return (await self._fetch(payload, asyncio.Semaphore(1)))["results"]
+
+    async def search_by_metacritic(self, score: tuple, ordering: str="-metacritic", page: int=1) -> list[dict]:
+        return await self.fetch_pages("search_by_metacritic", score, ordering=ordering, pages=range(page, page + 1))
+
+    async def search_by_genre(self, genre: str, ordering: str="-metacritic", page: int=1) -> list[dict]:
+        return await self.fetch_pages("search_by_genre", genre, ordering=ordering, pages=range(page, page + 1))
+
+    async def search_by_dates(self, dates: tuple, ordering: str="-metacritic", page: int=1) -> list[dict]:
+        return await self.fetch_pages("search_by_dates", dates, ordering=ordering, pages=range(page, page + 1))
+
+    async def fetch_pages(self, method: str, *args, pages: range = None, **kwargs) -> list[dict]:
+        """
+        fetches several pages of a search concurrently
+
+        :param method: name of a paginated GameInfo method (search_by_metacritic, search_by_genre, search_by_dates)
+        :type method: str
+        :param args: arguments of the method, without the page
+        :param pages: pages to fetch. Defaults to every page of the result set (up to page 100), found with the first page
+        :type pages: range
+        :param kwargs: keyword arguments of the method, without the page (ie: ordering)
+        :returns: the games of every page, in page order
+        :rtype: list[dict]
+
+        """
+        if method not in self._paginated:
+            raise ValueError("Invalid paginated method")
+        build_payload = getattr(self.game_info, self._paginated[method])
+
+        # build every payload first so invalid arguments raise before any request
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if pages is None:
+            first = await self._fetch(build_payload(*args, page=1, **kwargs), semaphore)
+            last_page = min(MAX_PAGE, max(1, math.ceil(first.get("count", 0) / PAGE_SIZE)))
+            payloads = [build_payload(*args, page=page, **kwargs) for page in range(2, last_page + 1)]
+            responses = [first]
+        else:
+            payloads = [build_payload(*args, page=page, **kwargs) for page in pages]
+            responses = []
+
+        responses += await asyncio.gather(*(self._fetch(payload, semaphore) for payload in payloads))
+        return [game for response in responses for game in response["results"]]
+
+    def fetch_all_pages(self, method: str, *args, pages: range = None, **kwargs) -> list[dict]:
+        """synchronous wrapper of fetch_pages. It can't be called from a running event loop"""
+        return asyncio.run(self.fetch_pages(method, *args, pages=pages, **kwargs))
@@ -0,0 +1,310 @@
+"""
+Benchmarks of the hot paths of the project: api client, model construction, favorites and rendering.
+
+The api is replaced by a local stub server serving canned paginated results, so the numbers don't
+depend on the network or on a valid API KEY (the e.env file must still exist).
+Results are saved as JSON to compare them between commits.
+
+Usage example:
+    python benchmark.py --output before.json
+    python benchmark.py --compare before.json
+    python benchmark.py --sizes 1000 100000
+
+"""
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from tabulate import tabulate
+from cache import ResponseCache
+from favorites import Favorites
+from game import Game
+from gameinfo import GameInfo, PAGE_SIZE, MAX_PAGE
+from UI import UI, MenuTable
+
+
+def fake_game(i: int) -> dict:
+    """returns a game dict shaped like the RAWG api results, including the fields the project ignores"""
+    return {
+        "id": i,
+        "slug": f"game-{i}",
+        "name": f"Game {i}",
+        "released": f"{2000 + i % 25}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        "tba": False,
+        "background_image": f"https://media.rawg.io/media/games/{i:06d}.jpg",
+        "rating": 4.2,
+        "rating_top": 5,
+        "ratings": [{"id": 5, "title": "exceptional", "count": 100 + i % 50, "percent": 60.0}],
+        "ratings_count": 200,
+        "metacritic": 50 + i % 50,
+        "playtime": i % 40,
+        "updated": "2025-01-01T00:00:00",
+        "platforms": [{"platform": {"id": 4, "name": "PC", "slug": "pc"}, "released_at": "2004-11-16"}],
+        "stores": [{"id": 1, "store": {"id": 1, "name": "Steam", "slug": "steam"}}],
+        "tags": [{"id": t, "name": f"tag {t}", "slug": f"tag-{t}", "games_count": 1000} for t in range(8)],
+        "short_screenshots": [{"id": s, "image": f"https://media.rawg.io/media/screenshots/{i}-{s}.jpg"} for s in range(6)],
+        "genres": [{"id": 4, "name": "Action", "slug": "action"}, {"id": 2, "name": "Shooter", "slug": "shooter"}]
+    }
+
+
+class StubRAWG:
+    """
+    Local HTTP server answering like the RAWG games endpoint, with ``count`` games split in pages of 20.
+
+    Usage example:
+        with StubRAWG(count=200) as stub:
+            game_info = GameInfo(url=stub.url)
+
+    """
+    def __init__(self, count: int = PAGE_SIZE * MAX_PAGE):
+        self._count = count
+        self._requests = 0
+        self._pages = {}
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes, don't let them wait for a delayed ack
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub._requests += 1
+                url = urlparse(self.path)
+                page = int(parse_qs(url.query).get("page", ["1"])[0])
+                body = stub._page(page, f"http://{self.headers['Host']}{url.path}", url.query)
+                status = 200 if body else 404
+                body = body or b'{"detail": "Invalid page."}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/games"
+
+    @property
+    def requests(self):
+        """number of requests served"""
+        return self._requests
+
+    def _page(self, page: int, url: str, query: str) -> bytes:
+        start = (page - 1) * PAGE_SIZE
+        if page < 1 or start >= self._count:
+            return None
+
+        # pages are built once, the server only pays for sending them
+        if page not in self._pages:
+            params = {k: v[0] for k, v in parse_qs(query).items()}
+            more = start + PAGE_SIZE < self._count and page < MAX_PAGE
+            next_url = url + "?" + "&".join(f"{k}={v}" for k, v in {**params, "page": page + 1}.items())
+            self._pages[page] = json.dumps({
+                "count": self._count,
+                "next": next_url if more else None,
+                "previous": None,
+                "results": [fake_game(i) for i in range(start, min(start + PAGE_SIZE, self._count))]
+            }).encode()
+        return self._pages[page]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class Benchmark:
+    """runs timed cases and collects their results"""
+
+    def __init__(self):
+        self._results = {}
+
+    @property
+    def results(self):
+        return self._results
+
+    def run(self, name: str, fn, repeat: int = 5, setup=None, n: int = 1):
+        """
+        times fn repeat times and records min/median seconds. setup runs before each repetition,
+        outside of the timing, and its return value is passed to fn.
+        """
+        times = []
+        for _ in range(repeat):
+            state = setup() if setup else None
+            start = time.perf_counter()
+            fn(state) if setup else fn()
+            times.append(time.perf_counter() - start)
+
+        self._results[name] = {
+            "min": min(times),
+            "median": statistics.median(times),
+            "repeat": repeat,
+            "n": n
+        }
+        print(f"{name:<45} {self._results[name]['median'] * 1000:>12.3f} ms")
+
+
+def quiet(fn, *args):
+    """calls fn discarding what it prints"""
+    with redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def make_games(n: int) -> list[Game]:
+    return [Game(f"Game {i}", f"{2000 + i % 25}-01-01", ("Action", "Shooter"), 50 + i % 50, None) for i in range(n)]
+
+
+def filled_favorites(games: list[Game]) -> Favorites:
+    favorites = Favorites()
+    for game in games:
+        favorites.add(game)
+    return favorites
+
+
+def bench_gameinfo(bench: Benchmark, stub: StubRAWG):
+    cold = GameInfo(url=stub.url)
+    bench.run("gameinfo.search_by_genre.cold", lambda: cold.search_by_genre("action"), repeat=20)
+    bench.run("gameinfo.search_by_name.cold", lambda: cold.search_by_name("game"), repeat=20)
+
+    warm = GameInfo(url=stub.url, cache=ResponseCache(":memory:"))
+    warm.search_by_genre("action")
+    bench.run("gameinfo.search_by_genre.warm", lambda: warm.search_by_genre("action"), repeat=20)
+
+    bench.run("gameinfo.iter_genre.all_pages", lambda: sum(1 for _ in cold.iter_genre("action")), repeat=3, n=MAX_PAGE)
+    cold.close()
+    warm.close()
+
+
+def bench_populate(bench: Benchmark):
+    ui = UI()
+    pages = [[fake_game(page * PAGE_SIZE + i) for i in range(PAGE_SIZE)] for page in range(MAX_PAGE)]
+
+    def populate():
+        for page in pages:
+            ui._populate_game_list(page)
+
+    bench.run("ui.populate_game_list.100_pages", populate, repeat=5, n=MAX_PAGE * PAGE_SIZE)
+
+
+def bench_favorites(bench: Benchmark, sizes: list[int], directory: str):
+    for n in sizes:
+        games = make_games(n)
+        repeat = 3 if n <= 100_000 else 1
+
+        bench.run(f"favorites.add.{n}", lambda: filled_favorites(games), repeat=repeat, n=n)
+        bench.run(
+            f"favorites.remove.{n}",
+            lambda favorites: [favorites.remove(game) for game in games],
+            setup=lambda: filled_favorites(games),
+            repeat=repeat,
+            n=n
+        )
+
+        favorites = filled_favorites(games)
+        favorites.filename = os.path.join(directory, f"favorites_{n}.json")
+        bench.run(f"favorites.export_json.{n}", favorites.export_json, repeat=repeat, n=n)
+        bench.run(f"favorites.import_json.{n}", favorites.import_json, repeat=repeat, n=n)
+
+
+def bench_render(bench: Benchmark, sizes: list[int]):
+    ui = UI()
+    for n in sizes:
+        games = make_games(n)
+        bench.run(f"menutable.get_from_list.{n}", lambda: MenuTable.get_from_list(games), repeat=5, n=n)
+        bench.run(
+            f"menutable.tabulate.{n}",
+            lambda: tabulate(MenuTable.get_from_list(games), headers="firstrow", tablefmt="outline"),
+            repeat=3,
+            n=n
+        )
+
+        # a redraw of the favorites context: one page, rendered once per version of the list
+        favorites = filled_favorites(games)
+        bench.run(
+            f"ui.print_game_page.{n}",
+            lambda: quiet(ui._print_game_page, "favorites", favorites.version, len(favorites), favorites.window),
+            repeat=5,
+            n=n
+        )
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[list]:
+    """returns rows of name, old ms, new ms and ratio for the cases present in both runs"""
+    rows = []
+    for name, result in new.items():
+        if name not in old:
+            continue
+        ratio = result["median"] / old[name]["median"] if old[name]["median"] else float("inf")
+        flag = "REGRESSION" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "")
+        rows.append([name, old[name]["median"] * 1000, result["median"] * 1000, ratio, flag])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmarks of the project hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000], help="favorites sizes")
+    parser.add_argument("--render-sizes", type=int, nargs="+", default=[100, 1_000, 10_000], help="rendered table sizes")
+    parser.add_argument("--output", default="benchmark.json", help="file where the results are saved")
+    parser.add_argument("--compare", help="results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    # measure the client, not the client side quota
+    GameInfo.set_rate_limit(None)
+
+    bench = Benchmark()
+    with StubRAWG() as stub:
+        bench_gameinfo(bench, stub)
+    bench_populate(bench)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_favorites(bench, args.sizes, directory)
+    bench_render(bench, args.render_sizes)
+
+    report = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "results": bench.results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        rows = compare(old["results"], bench.results, args.threshold)
+        print(tabulate(rows, headers=["case", "old ms", "new ms", "ratio", ""], floatfmt=".3f", tablefmt="simple"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
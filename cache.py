@@ -0,0 +1,160 @@
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+class ResponseCache:
+    """
+    Two tier cache for RAWG responses: an in-memory LRU backed by a local SQLite file.
+
+    Entries are keyed by the normalized request payload (the api key is never part of the key)
+    and expire after a ttl that depends on the type of query.
+
+    Usage example:
+        cache = ResponseCache("rawg_cache.sqlite")
+        game_info = GameInfo(cache=cache)
+
+    """
+
+    # seconds an entry stays fresh for each type of query
+    default_ttls = {
+        "search": 60 * 60,
+        "metacritic": 24 * 60 * 60,
+        "genres": 24 * 60 * 60,
+        "dates": 24 * 60 * 60,
+        "default": 60 * 60
+    }
+
+    def __init__(self, filename: str = "rawg_cache.sqlite", max_memory_entries: int = 256, max_disk_entries: int = 10000, ttls: dict = None):
+        """
+        :param filename: SQLite file used as the persistent tier. Use ``":memory:"`` to keep the cache in this process only
+        :type filename: str
+        :param max_memory_entries: maximum responses kept in the in-memory LRU. Defaults to ``256``
+        :type max_memory_entries: int
+        :param max_disk_entries: maximum responses kept in the SQLite file, least recently used are evicted first. Defaults to ``10000``
+        :type max_disk_entries: int
+        :param ttls: overrides of ``default_ttls`` by query type
+        :type ttls: dict[str, int]
+
+        """
+        self._filename = filename
+        self._max_memory_entries = max_memory_entries
+        self._max_disk_entries = max_disk_entries
+        self._ttls = {**self.default_ttls, **(ttls or {})}
+
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def ttls(self):
+        return self._ttls
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        """returns the cache key of a payload. The api key is excluded and every value is compared as a string"""
+        return json.dumps({k: str(v) for k, v in payload.items() if k != "key"}, sort_keys=True)
+
+    @staticmethod
+    def query_type(payload: dict) -> str:
+        """returns the type of query of a payload (search, metacritic, genres, dates or default)"""
+        for query_type in ("search", "metacritic", "genres", "dates"):
+            if query_type in payload:
+                return query_type
+        return "default"
+
+    def get(self, payload: dict) -> dict:
+        """returns the cached response of payload, or None if it is missing or expired"""
+        key = self.key(payload)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+
+            row = self._db.execute("SELECT data, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                data = json.loads(row[0])
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, row[1], data)
+                self._hits += 1
+                return data
+
+            self._misses += 1
+            return None
+
+    def set(self, payload: dict, data: dict):
+        """stores the response of payload in both tiers"""
+        key = self.key(payload)
+        now = time.time()
+        expires = now + self.ttls.get(self.query_type(payload), self.ttls["default"])
+
+        with self._lock:
+            self._remember(key, expires, data)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, data, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(data), expires, now)
+            )
+            # evict expired entries first, then the least recently used ones
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self._max_disk_entries,)
+            )
+            self._db.commit()
+
+    def clear(self):
+        """removes every entry from both tiers and resets the counters"""
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> dict:
+        """returns the hit/miss counters and the number of entries in each tier"""
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries
+            }
+
+    def close(self):
+        self._db.close()
+
+    def _remember(self, key: str, expires: float, data: dict):
+        self._memory[key] = (expires, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)
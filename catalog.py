@@ -0,0 +1,298 @@
+from collections.abc import Iterable, Iterator
+from game import Game, ORDER_KEYS
+from itertools import islice
+from typing import NamedTuple
+import sqlite3
+import threading
+import time
+
+class UpsertStats(NamedTuple):
+    """number of games inserted, updated and left unchanged by CatalogStore.upsert"""
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+class CatalogStore:
+    """
+    Local SQLite catalog of games shared by every process using the same file.
+
+    Games are upserted in batched transactions, keyed by the RAWG id when it is known and by
+    name and release date otherwise: two RAWG games may share a name and a date, games without
+    an id may not. Genres, release dates and metacritic scores are indexed,
+    and the database runs in WAL mode so readers are never blocked by a writer.
+    Subsets of the catalog, like the favorites, are kept as tags.
+
+    Usage example:
+        catalog = CatalogStore("catalog.sqlite")
+        catalog.upsert(game_info.search_by_genre("RPG"))
+        for game in catalog.query(genre="RPG", released=("2015-01-01", "2020-12-31"), order_by="-metacritic"):
+            print(game)
+
+    """
+
+    # columns of the games table
+    _games_columns = """
+        id INTEGER PRIMARY KEY,
+        rawg_id INTEGER UNIQUE,
+        name TEXT NOT NULL,
+        released TEXT NOT NULL DEFAULT '',
+        metacritic INTEGER,
+        background_url TEXT,
+        genres TEXT NOT NULL DEFAULT '',
+        updated REAL NOT NULL
+    """
+
+    # unit separator: joins the genres of a game in a single column
+    _separator = "\x1f"
+
+    def __init__(self, filename: str = "catalog.sqlite", batch_size: int = 500):
+        """
+        :param filename: SQLite file of the catalog. Use ``":memory:"`` for a catalog of this process only
+        :type filename: str
+        :param batch_size: games written per transaction. Defaults to ``500``
+        :type batch_size: int
+
+        """
+        self._filename = filename
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+        # released is '' instead of NULL for games without date, so (name, released) stays unique for games without id
+        self._db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS games ({self._games_columns});
+            CREATE UNIQUE INDEX IF NOT EXISTS games_without_id ON games (name, released) WHERE rawg_id IS NULL;
+            CREATE INDEX IF NOT EXISTS games_key ON games (name, released);
+            CREATE TABLE IF NOT EXISTS game_genres (
+                genre TEXT NOT NULL COLLATE NOCASE,
+                game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+                PRIMARY KEY (genre, game_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS tags (
+                tag TEXT NOT NULL,
+                game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (tag, game_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS games_released ON games (released);
+            CREATE INDEX IF NOT EXISTS games_metacritic ON games (metacritic);
+            CREATE INDEX IF NOT EXISTS game_genres_game ON game_genres (game_id);
+            CREATE INDEX IF NOT EXISTS tags_game ON tags (game_id);
+        """)
+        self._db.commit()
+
+    def _migrate(self):
+        """drops the UNIQUE (name, released) constraint of the games table of older catalogs"""
+        row = self._db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'games'").fetchone()
+        if not row or "UNIQUE (name, released)" not in row[0]:
+            return
+        # the table is rebuilt: without foreign keys, the genres and tags pointing to it are kept
+        self._db.execute("PRAGMA foreign_keys=OFF")
+        try:
+            with self._db:
+                self._db.execute(f"CREATE TABLE games_new ({self._games_columns})")
+                self._db.execute("INSERT INTO games_new SELECT id, rawg_id, name, released, metacritic, background_url, genres, updated FROM games")
+                self._db.execute("DROP TABLE games")
+                self._db.execute("ALTER TABLE games_new RENAME TO games")
+        finally:
+            self._db.execute("PRAGMA foreign_keys=ON")
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def connection(self):
+        return self._db
+
+    def __len__(self):
+        return self._db.execute("SELECT count(*) FROM games").fetchone()[0]
+
+    def __contains__(self, game):
+        return isinstance(game, Game) and self._id(game.key) is not None
+
+    def close(self):
+        self._db.close()
+
+    def _id(self, key: tuple) -> int:
+        name, released = key
+        row = self._db.execute("SELECT id FROM games WHERE name = ? AND released = ? ORDER BY id LIMIT 1", (name, released or "")).fetchone()
+        return row[0] if row else None
+
+    # Writes
+
+    @staticmethod
+    def _game_and_id(game) -> tuple[Game, int]:
+        """returns the Game and RAWG id of a Game or a game dict of the api results"""
+        if isinstance(game, Game):
+            return game, None
+        return Game.from_api(game), game.get("id")
+
+    def upsert(self, games: Iterable) -> UpsertStats:
+        """
+        inserts new games and updates the stored ones whose fields changed
+
+        :param games: Game objects or the game dicts of the api results (their RAWG id is stored too)
+        :type games: Iterable[Game | dict]
+        :returns: number of games inserted, updated and unchanged
+        :rtype: UpsertStats
+
+        """
+        inserted = updated = unchanged = 0
+        games = iter(games)
+        while batch := list(islice(games, self._batch_size)):
+            with self._lock, self._db:
+                for game in batch:
+                    result = self._upsert_one(*self._game_and_id(game))
+                    inserted += result == "inserted"
+                    updated += result == "updated"
+                    unchanged += result == "unchanged"
+        return UpsertStats(inserted, updated, unchanged)
+
+    def _upsert_one(self, game: Game, rawg_id: int) -> str:
+        released = game.released or ""
+        genres = self._separator.join(game.genres)
+        columns = "SELECT id, rawg_id, name, released, metacritic, background_url, genres FROM games"
+        if rawg_id is not None:
+            # a game stored before its id was known gets it
+            row = (self._db.execute(f"{columns} WHERE rawg_id = ?", (rawg_id,)).fetchone()
+                   or self._db.execute(f"{columns} WHERE name = ? AND released = ? AND rawg_id IS NULL", (game.name, released)).fetchone())
+        else:
+            row = self._db.execute(f"{columns} WHERE name = ? AND released = ? ORDER BY id LIMIT 1", (game.name, released)).fetchone()
+
+        if row is None:
+            cursor = self._db.execute(
+                "INSERT INTO games (rawg_id, name, released, metacritic, background_url, genres, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (rawg_id, game.name, released, game.metacritic, game.background_url, genres, time.time())
+            )
+            self._set_genres(cursor.lastrowid, game.genres)
+            return "inserted"
+
+        game_id, stored_rawg_id = row[0], row[1]
+        if row[2:] == (game.name, released, game.metacritic, game.background_url, genres) and (rawg_id is None or rawg_id == stored_rawg_id):
+            return "unchanged"
+
+        self._db.execute(
+            "UPDATE games SET rawg_id = ?, name = ?, released = ?, metacritic = ?, background_url = ?, genres = ?, updated = ? WHERE id = ?",
+            (rawg_id if rawg_id is not None else stored_rawg_id, game.name, released, game.metacritic, game.background_url, genres, time.time(), game_id)
+        )
+        if genres != row[6]:
+            self._db.execute("DELETE FROM game_genres WHERE game_id = ?", (game_id,))
+            self._set_genres(game_id, game.genres)
+        return "updated"
+
+    def _set_genres(self, game_id: int, genres: tuple):
+        self._db.executemany("INSERT OR IGNORE INTO game_genres (genre, game_id) VALUES (?, ?)", ((genre, game_id) for genre in genres))
+
+    def delete(self, game: Game):
+        with self._lock, self._db:
+            cursor = self._db.execute("DELETE FROM games WHERE name = ? AND released = ?", (game.name, game.released or ""))
+        if not cursor.rowcount:
+            raise ValueError(f"{game} is not in the catalog")
+
+    # Tags
+
+    def tag(self, games: Iterable[Game], tag: str, replace: bool = False):
+        """
+        adds the games to the subset tag. Games missing from the catalog are upserted first
+
+        :param replace: the subset becomes exactly these games. Defaults to ``False``
+        :type replace: bool
+
+        """
+        games = list(games)
+        self.upsert(games)
+        with self._lock, self._db:
+            if replace:
+                self._db.execute("DELETE FROM tags WHERE tag = ?", (tag,))
+            position = self._db.execute("SELECT coalesce(max(position), 0) FROM tags WHERE tag = ?", (tag,)).fetchone()[0]
+            for game in games:
+                position += 1
+                self._db.execute("INSERT OR IGNORE INTO tags (tag, game_id, position) VALUES (?, ?, ?)", (tag, self._id(game.key), position))
+
+    def untag(self, games: Iterable[Game], tag: str):
+        with self._lock, self._db:
+            for game in games:
+                self._db.execute("DELETE FROM tags WHERE tag = ? AND game_id = ?", (tag, self._id(game.key)))
+
+    def clear_tag(self, tag: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tags WHERE tag = ?", (tag,))
+
+    def tagged(self, tag: str) -> Iterator[Game]:
+        """yields the games of the subset tag in the order they were tagged"""
+        return self.query(tag=tag)
+
+    # Queries
+
+    def _row_to_game(self, row: tuple) -> Game:
+        name, released, genres, metacritic, background_url = row
+        return Game(name, released or None, genres.split(self._separator) if genres else (), metacritic, background_url)
+
+    def query(self, genre: str = None, released: tuple = None, metacritic: tuple = None, tag: str = None,
+              order_by: str = None, limit: int = None, fetch_size: int = 256) -> Iterator[Game]:
+        """
+        yields the games matching every filter given. Rows are read and turned into Game objects
+        fetch_size at a time, as the iterator is consumed
+
+        :param genre: genre the game must have (case insensitive)
+        :type genre: str
+        :param released: date range, both included (ie: ("2015-01-01", "2020-12-31"))
+        :type released: tuple[str, str]
+        :param metacritic: score range, both included (ie: (85, 100))
+        :type metacritic: tuple[int, int]
+        :param tag: subset the game must belong to (ie: favorites)
+        :type tag: str
+        :param order_by: name, released or metacritic. Invert with '-' (-metacritic). Defaults to insertion order (tag order with a tag)
+        :type order_by: str
+        :param limit: maximum number of games
+        :type limit: int
+        :param fetch_size: rows read at a time. Defaults to ``256``
+        :type fetch_size: int
+        :returns: an iterator of the games matching the query
+        :rtype: Iterator[Game]
+
+        """
+        sql = "SELECT g.name, g.released, g.genres, g.metacritic, g.background_url FROM games g"
+        where, params = [], []
+        if tag is not None:
+            sql += " JOIN tags t ON t.game_id = g.id AND t.tag = ?"
+            params.append(tag)
+        if genre is not None:
+            where.append("g.id IN (SELECT game_id FROM game_genres WHERE genre = ?)")
+            params.append(genre)
+        if released:
+            where.append("g.released BETWEEN ? AND ?")
+            params.extend(released)
+        if metacritic:
+            where.append("g.metacritic BETWEEN ? AND ?")
+            params.extend(metacritic)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        if order_by:
+            # the fields of ORDER_KEYS are columns of the games table
+            column = order_by.lstrip("-")
+            if column not in ORDER_KEYS:
+                raise ValueError("Invalid ordering method")
+            sql += f" ORDER BY g.{column} {'DESC' if order_by.startswith('-') else 'ASC'}, g.id"
+        else:
+            sql += " ORDER BY t.position" if tag is not None else " ORDER BY g.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return self._iter_rows(sql, params, fetch_size)
+
+    def _iter_rows(self, sql: str, params: list, fetch_size: int) -> Iterator[Game]:
+        cursor = self._db.execute(sql, params)
+        try:
+            while rows := cursor.fetchmany(fetch_size):
+                yield from map(self._row_to_game, rows)
+        finally:
+            cursor.close()
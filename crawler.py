@@ -0,0 +1,209 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from game import Game
+from gameinfo import GameInfo, InvalidAPIKeyError, PAGE_SIZE, MAX_PAGE
+from jsonstream import TransferStats, decode_page
+from storage import atomic_write
+import json
+import math
+import os
+import time
+
+def _decode_page(content: bytes) -> tuple[int, list[str]]:
+    """
+    runs in a worker process: parses a page of results and returns the result count and
+    one JSON line per game, in the format of Game.to_json()
+    """
+    data = decode_page(content)
+    if data.get("error"):
+        raise InvalidAPIKeyError("Invalid API KEY")
+    lines = [json.dumps(game.to_json()) for game in Game.from_api_many(data["results"])]
+    return data["count"], lines
+
+
+class ShardWriter:
+    """
+    Writes JSON lines to numbered shard files (part-00000.jsonl, ...) of at most shard_size rows.
+    Its position (shard, rows, bytes) is saved in the crawl checkpoint, so an interrupted crawl
+    can drop what was written after the last checkpoint and continue from there.
+    """
+    def __init__(self, directory: str, shard_size: int, shard: int = 0, shard_rows: int = 0, shard_bytes: int = 0):
+        self._directory = directory
+        self._shard_size = shard_size
+        self._shard = shard
+        self._shard_rows = shard_rows
+
+        # drop rows written after the checkpoint, and shards started after it
+        self._file = open(self._path(shard), "ab")
+        self._file.truncate(shard_bytes)
+        self._file.seek(0, os.SEEK_END)
+        next_shard = shard + 1
+        while os.path.exists(self._path(next_shard)):
+            os.remove(self._path(next_shard))
+            next_shard += 1
+
+    def _path(self, shard: int) -> str:
+        return os.path.join(self._directory, f"part-{shard:05d}.jsonl")
+
+    def position(self) -> dict:
+        return {"shard": self._shard, "shard_rows": self._shard_rows, "shard_bytes": self._file.tell()}
+
+    def write(self, lines: list[str]):
+        for line in lines:
+            if self._shard_rows >= self._shard_size:
+                self._file.close()
+                self._shard += 1
+                self._shard_rows = 0
+                self._file = open(self._path(self._shard), "wb")
+            self._file.write(line.encode() + b"\n")
+            self._shard_rows += 1
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Crawler:
+    """
+    Headless crawl of every page of a set of genres and/or date windows into sharded JSON lines files.
+
+    Pages are fetched concurrently on the pooled session of GameInfo and decoded into games in a
+    process pool. After each page is written the checkpoint file is updated, so running the same
+    crawl again resumes where it stopped.
+
+    Usage example:
+        crawler = Crawler(GameInfo(), "crawl", genres=GameInfo().genres)
+        stats = crawler.run()
+
+    """
+    def __init__(self, game_info: GameInfo, directory: str, genres: list[str] = (), date_windows: list[tuple] = (),
+                 ordering: str = "-metacritic", concurrency: int = 8, workers: int = None, shard_size: int = 50000):
+        """
+        :param game_info: client used for the requests
+        :type game_info: GameInfo
+        :param directory: output directory of the shards and the checkpoint. Created if missing
+        :type directory: str
+        :param genres: genres to crawl
+        :type genres: list[str]
+        :param date_windows: date ranges to crawl (ie: [("2020-01-01", "2020-12-31")])
+        :type date_windows: list[tuple[str, str]]
+        :param ordering: ordering of the results. Defaults to ``-metacritic``
+        :type ordering: str
+        :param concurrency: requests in flight. Defaults to ``8``
+        :type concurrency: int
+        :param workers: decoding processes. Defaults to the number of CPUs
+        :type workers: int
+        :param shard_size: rows per output file. Defaults to ``50000``
+        :type shard_size: int
+
+        """
+        self._game_info = game_info
+        self._directory = directory
+        self._concurrency = concurrency
+        self._workers = workers
+        self._shard_size = shard_size
+
+        # every unit of work is a paginated query. Payloads are built first so invalid arguments fail before any request
+        self._units = {f"genre:{genre}": lambda page, genre=genre: game_info._genre_payload(genre, ordering, page) for genre in genres}
+        self._units.update({f"dates:{start},{end}": lambda page, dates=(start, end): game_info._dates_payload(dates, ordering, page) for start, end in date_windows})
+        for build_payload in self._units.values():
+            build_payload(1)
+
+        os.makedirs(directory, exist_ok=True)
+        self._checkpoint = self._load_checkpoint()
+
+    @property
+    def checkpoint_filename(self):
+        return os.path.join(self._directory, "checkpoint.json")
+
+    @property
+    def units(self):
+        return list(self._units)
+
+    def _load_checkpoint(self) -> dict:
+        try:
+            with open(self.checkpoint_filename, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"units": {}, "rows": 0, "shard": 0, "shard_rows": 0, "shard_bytes": 0}
+
+    def _save_checkpoint(self, writer: ShardWriter):
+        self._checkpoint.update(writer.position())
+        with atomic_write(self.checkpoint_filename) as f:
+            json.dump(self._checkpoint, f)
+
+    def run(self, progress=print) -> TransferStats:
+        """
+        crawls every unit not completed yet
+
+        :param progress: called with a message after each unit. Defaults to ``print``
+        :returns: number of rows written by this run and time taken
+        :rtype: TransferStats
+
+        """
+        start = time.perf_counter()
+        rows = 0
+        position = {k: self._checkpoint[k] for k in ("shard", "shard_rows", "shard_bytes")}
+        writer = ShardWriter(self._directory, self._shard_size, **position)
+
+        try:
+            with ThreadPoolExecutor(self._concurrency) as fetcher, ProcessPoolExecutor(self._workers) as decoder:
+                for unit, build_payload in self._units.items():
+                    state = self._checkpoint["units"].setdefault(unit, {"pages": None, "done": []})
+                    unit_rows = self._crawl_unit(state, build_payload, fetcher, decoder, writer)
+                    rows += unit_rows
+                    rate = rows / (time.perf_counter() - start)
+                    progress(f"{unit}: {unit_rows} rows ({rate:.0f} rows/sec)")
+        finally:
+            writer.close()
+
+        return TransferStats(rows, time.perf_counter() - start)
+
+    def _crawl_unit(self, state: dict, build_payload, fetcher, decoder, writer: ShardWriter) -> int:
+        rows = 0
+
+        def fetch(page: int):
+            return self._game_info._get(build_payload(page)).content
+
+        def commit(page: int, count: int, lines: list[str]):
+            nonlocal rows
+            writer.write(lines)
+            rows += len(lines)
+            self._checkpoint["rows"] += len(lines)
+            state["done"].append(page)
+            if state["pages"] is None:
+                state["pages"] = min(MAX_PAGE, math.ceil(count / PAGE_SIZE))
+            self._save_checkpoint(writer)
+
+        # the first page tells how many pages there are
+        if state["pages"] is None:
+            commit(1, *decoder.submit(_decode_page, fetch(1)).result())
+
+        done = set(state["done"])
+        fetches = {fetcher.submit(fetch, page): page for page in range(1, state["pages"] + 1) if page not in done}
+        decodes = {}
+
+        # every page is decoded as soon as it arrives and committed as soon as it is decoded,
+        # so an interrupted unit keeps its finished pages. After an error the pages in flight are still committed
+        pending = set(fetches)
+        error = None
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                        for fetching in fetches:
+                            fetching.cancel()
+                    continue
+                if future in fetches:
+                    decode = decoder.submit(_decode_page, result)
+                    decodes[decode] = fetches[future]
+                    pending.add(decode)
+                else:
+                    commit(decodes[future], *result)
+        if error:
+            raise error
+
+        return rows
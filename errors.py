@@ -0,0 +1,24 @@
+# errors of the requests to the api. They live apart from gameinfo.py so the UI can
+# handle them without importing requests at startup
+
+
+class GameInfoError(Exception):
+    """base class of the errors of a request to the api. The program can recover from them"""
+
+
+class APIRequestError(GameInfoError):
+    """the request failed: connection error, timeout or an HTTP error status after the retries"""
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimitError(APIRequestError):
+    """the api answered 429 Too Many Requests after the retries"""
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message, status=429)
+        self.retry_after = retry_after
+
+
+class InvalidAPIKeyError(GameInfoError):
+    """the api rejected the API KEY"""
@@ -1,11 +1,33 @@
 from game import Game
+from storage import FavoritesJournal, atomic_write
+from jsonstream import TransferStats, export_games, iter_games
+from itertools import islice
+from metrics import metrics
 import json
+import time
+import os
 
 class Favorites:
     def __init__(self):
-        self._favorites: list[Game] = []
+        # ordered hash index: game.key -> game. Keeps insertion order with O(1) add, remove and lookups
+        self._favorites: dict[tuple, Game] = {}
         self._filename = "favorites.json"
 
+        # secondary indexes for filtered views: value -> {game.key: game}
+        self._by_genre: dict[str, dict[tuple, Game]] = {}
+        self._by_year: dict[int, dict[tuple, Game]] = {}
+        self._by_metacritic: dict[int, dict[tuple, Game]] = {}
+
+        # changes every time the favorites change, to know when a view of them is outdated
+        self._version = 0
+
+        # when enabled, every add/remove is appended to the journal and export_json compacts it
+        self._journal: FavoritesJournal = None
+        self._compact_every = 1000
+
+        # True once the favorites in memory include the favorites file (imported from it or replacing it)
+        self._loaded = False
+
 
     @property
     def filename(self):
@@ -16,55 +38,254 @@ class Favorites:
         if not name.endswith(".json"):
             raise ValueError("File extension must be json")
         
+        if name != self._filename:
+            # the favorites in memory don't include the new file
+            self._loaded = False
         self._filename = name
+        if self._journal:
+            # the journal follows the favorites file
+            self._journal.close()
+            self._journal = FavoritesJournal(self.journal_filename)
+
+    @property
+    def journal_filename(self):
+        return self.filename[:-len(".json")] + ".journal.jsonl"
+
+    @property
+    def journal(self):
+        return self._journal
+
+    def enable_journal(self, compact_every: int = 1000, durable: bool = False):
+        """
+        records every add/remove in a journal next to the favorites file, so edits are saved
+        without rewriting the whole file. import_json replays it and export_json compacts it.
+
+        :param compact_every: export the favorites file once the journal has this many operations. Defaults to ``1000``
+        :type compact_every: int
+        :param durable: fsync the journal after every operation. Defaults to ``False``
+        :type durable: bool
+
+        """
+        if self._journal:
+            self._journal.close()
+        self._compact_every = compact_every
+        self._journal = FavoritesJournal(self.journal_filename, durable=durable)
 
     @property
     def favorites(self):
-        return self._favorites
+        return list(self._favorites.values())
+
+    @property
+    def version(self):
+        return self._version
+
+    def window(self, start: int, stop: int) -> list[Game]:
+        """returns the favorites between the positions start and stop, without copying the whole list"""
+        return list(islice(self._favorites.values(), start, stop))
+
+    def __len__(self):
+        return len(self._favorites)
+
+    def __contains__(self, game):
+        return isinstance(game, Game) and game.key in self._favorites
+
+    def __iter__(self):
+        return iter(self._favorites.values())
     
     def _check_instance(self, game: Game):
         if not isinstance(game, Game):
             raise ValueError("game must be instance of class Game")
 
+    @staticmethod
+    def _year(game: Game):
+        return int(game.released[:4]) if game.released else None
+
+    @staticmethod
+    def _metacritic_bucket(score):
+        """returns the tens of the score (ie: 96 -> 90), or None if there is no score"""
+        return score // 10 * 10 if score is not None else None
+
+    def _secondary_keys(self, game: Game):
+        for genre in game.genres:
+            yield self._by_genre, genre
+        yield self._by_year, self._year(game)
+        yield self._by_metacritic, self._metacritic_bucket(game.metacritic)
+
+    def _insert(self, game: Game):
+        self._favorites[game.key] = game
+        self._version += 1
+        for index, value in self._secondary_keys(game):
+            index.setdefault(value, {})[game.key] = game
+
+    def _delete(self, game: Game):
+        del self._favorites[game.key]
+        self._version += 1
+        for index, value in self._secondary_keys(game):
+            bucket = index[value]
+            del bucket[game.key]
+            if not bucket:
+                del index[value]
+
     def add(self, game: Game):
         self._check_instance(game)
         
-        if game in self.favorites:
+        if game.key in self._favorites:
             raise ValueError(f"{game} already exists in Favorites")
         
-        self.favorites.append(game)
+        self._insert(game)
+        self._log("add", game)
 
     
     def remove(self, game: Game):
         self._check_instance(game)
 
-        try:
-            self.favorites.remove(game)
-        except ValueError:
+        # the stored game may be a different object equal to game
+        stored = self._favorites.get(game.key)
+        if stored is None:
             raise ValueError(f"{game} is not in Favorites")
+
+        self._delete(stored)
+        self._log("remove", stored)
+
+    def _log(self, op: str, game: Game):
+        if not self._journal:
+            return
+        with metrics.timer("favorites_journal_seconds"):
+            if op == "add":
+                self._journal.append_add(game)
+            else:
+                self._journal.append_remove(game)
+        if self._journal.operations >= self._compact_every:
+            self._compact()
+
+    def _compact(self):
+        """
+        saves the journaled operations in the favorites file and empties the journal.
+        Favorites edited without importing the file first are merged into it instead of replacing it
+        """
+        if self._loaded or not os.path.exists(self.filename):
+            self.export_json()
+            return
+
+        with metrics.timer("favorites_compact_seconds"):
+            merged = {}
+            for game in iter_games(self.filename):
+                merged.setdefault(game.key, game)
+            for op, value in self._journal.replay():
+                if op == "add":
+                    merged.setdefault(value.key, value)
+                else:
+                    merged.pop(value, None)
+            with atomic_write(self.filename, "wb") as f:
+                export_games(f, merged.values())
+        self._journal.truncate()
+
+    # Filtered views
+
+    def by_genre(self, genre: str) -> list[Game]:
+        """returns the favorites of the genre, in insertion order"""
+        return list(self._by_genre.get(genre, {}).values())
+
+    def by_year(self, year: int) -> list[Game]:
+        """returns the favorites released in year, in insertion order"""
+        return list(self._by_year.get(year, {}).values())
+
+    def by_metacritic(self, bucket: int) -> list[Game]:
+        """returns the favorites with a metacritic score in the bucket of tens (ie: 90 -> 90 to 99)"""
+        return list(self._by_metacritic.get(self._metacritic_bucket(bucket), {}).values())
             
         
         
-    def export_json(self):
-        with open(self.filename, "w") as f:
-            favorites = [game.to_json() for game in self.favorites]
-            json.dump(favorites, f)
+    def export_json(self) -> TransferStats:
+        """
+        saves the favorites to the favorites file, one game at a time
+
+        :returns: number of games written and time taken
+        :rtype: TransferStats
+
+        """
+        # written to a temporary file first: a crash never leaves a truncated favorites file
+        with metrics.timer("favorites_export_seconds"), atomic_write(self.filename, "wb") as f:
+            stats = export_games(f, self._favorites.values())
+
+        # every journaled operation is in the file now, and the file is the favorites in memory
+        self._loaded = True
+        if self._journal:
+            self._journal.truncate()
+        return stats
 
     
-    def import_json(self):
-        with open(self.filename, "r") as f:
+    def import_json(self) -> TransferStats:
+        """
+        loads the favorites from the favorites file, parsing one game at a time
+
+        :returns: number of games read and time taken
+        :rtype: TransferStats
+
+        """
+        start = time.perf_counter()
+
+        # load into empty indexes, the current ones are restored if the file is invalid
+        previous = (self._favorites, self._by_genre, self._by_year, self._by_metacritic)
+        self._favorites, self._by_genre, self._by_year, self._by_metacritic = {}, {}, {}, {}
+        self._version += 1
+
+        # with a journal the favorites may exist only as journaled operations
+        if not (self._journal and not os.path.exists(self.filename)):
             try:
-                game_list = json.load(f)
-                self._favorites = [Game(
-                    released=game["released"],
-                    name=game["name"],
-                    genres=game["genres"],
-                    metacritic=game["metacritic"],
-                    background_url=game["background_url"]
-                ) for game in game_list]
-            
+                for game in iter_games(self.filename):
+                    if game.key not in self._favorites:
+                        self._insert(game)
+            except FileNotFoundError:
+                self._favorites, self._by_genre, self._by_year, self._by_metacritic = previous
+                raise
             except json.JSONDecodeError:
+                self._favorites, self._by_genre, self._by_year, self._by_metacritic = previous
                 raise FileNotFoundError("Incorrect file type")
-                        
 
-    
\ No newline at end of file
+        if self._journal:
+            self._replay_journal()
+        self._loaded = True
+
+        stats = TransferStats(len(self), time.perf_counter() - start)
+        metrics.observe("favorites_import_seconds", stats.seconds)
+        return stats
+
+    def _replay_journal(self):
+        for op, value in self._journal.replay():
+            if op == "add":
+                if value.key not in self._favorites:
+                    self._insert(value)
+            elif value in self._favorites:
+                self._delete(self._favorites[value])
+
+    def export_catalog(self, catalog, tag: str = "favorites") -> TransferStats:
+        """
+        saves the favorites in a CatalogStore as the subset tag, replacing its previous content
+
+        :param catalog: catalog shared with other processes
+        :type catalog: CatalogStore
+        :param tag: name of the subset. Defaults to ``favorites``
+        :type tag: str
+        :returns: number of games written and time taken
+        :rtype: TransferStats
+
+        """
+        start = time.perf_counter()
+        catalog.tag(self._favorites.values(), tag, replace=True)
+        return TransferStats(len(self), time.perf_counter() - start)
+
+    def import_catalog(self, catalog, tag: str = "favorites") -> TransferStats:
+        """
+        loads the favorites from the subset tag of a CatalogStore, replacing the current ones
+
+        :returns: number of games read and time taken
+        :rtype: TransferStats
+
+        """
+        start = time.perf_counter()
+        self._favorites, self._by_genre, self._by_year, self._by_metacritic = {}, {}, {}, {}
+        self._version += 1
+        for game in catalog.tagged(tag):
+            self._insert(game)
+        return TransferStats(len(self), time.perf_counter() - start)
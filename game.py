@@ -1,12 +1,61 @@
 import csv
+import sys
+
+def _genre_names(genres) -> tuple:
+    """returns genres as a tuple of interned names. Accepts names or the genre dicts of the api"""
+    if not genres:
+        return ()
+    return tuple(sys.intern(genre["name"] if isinstance(genre, dict) else genre) for genre in genres)
+
+
+# fields of a game of the api results used by Game (id identifies it in the catalog, updated is the mark of a sync).
+# The rest are dropped at decode time
+API_FIELDS = ("id", "name", "released", "metacritic", "background_image", "updated")
+
+
+# fields the results can be ordered by (GameInfo.ordering_keywords, invert with '-') and the value
+# compared for each. Missing values sort first, so last in descending order
+ORDER_KEYS = {
+    "metacritic": lambda game: game.metacritic if game.metacritic is not None else -1,
+    "name": lambda game: game.name,
+    "released": lambda game: game.released or ""
+}
+
+
+def trim_api_game(game: dict) -> dict:
+    """returns a game dict of the api results with only API_FIELDS and the genres as a tuple of names"""
+    trimmed = {field: game.get(field) for field in API_FIELDS}
+    trimmed["genres"] = _genre_names(game.get("genres"))
+    return trimmed
+
 
 class Game:
+    # no per-instance __dict__: we hold a lot of games in memory
+    __slots__ = ("_name", "_released", "_genres", "_metacritic", "_background_url")
+
     def __init__(self, name: str, released: str, genres: tuple, metacritic: int, background_url: str):
         self._name = name
-        self._released = released
-        self._genres = genres
+        # many games share the same release date
+        self._released = sys.intern(released) if released else released
+        self._genres = _genre_names(genres)
         self._metacritic = metacritic
         self._background_url = background_url
+
+    @classmethod
+    def from_api(cls, game: dict) -> "Game":
+        """returns a Game from a game dict of the RAWG api results"""
+        return cls(game["name"], game["released"], game["genres"], game["metacritic"], game["background_image"])
+
+    @classmethod
+    def from_json(cls, game: dict) -> "Game":
+        """returns a Game from a dict made by to_json()"""
+        return cls(game["name"], game["released"], game["genres"], game["metacritic"], game["background_url"])
+
+    @classmethod
+    def from_api_many(cls, games: list[dict]) -> list["Game"]:
+        """returns a list of Game from the RAWG api results"""
+        from_api = cls.from_api
+        return [from_api(game) for game in games]
     
 
     @property
@@ -29,6 +78,11 @@ class Game:
     def background_url(self):
         return self._background_url
 
+    @property
+    def key(self):
+        """identity of the game, the same fields used by __eq__ and __hash__"""
+        return (self._name, self._released)
+
 
     def to_json(self):
         return {
@@ -46,5 +100,9 @@ class Game:
         else:
             return False
 
+    def __hash__(self):
+        # consistent with __eq__
+        return hash((self._name, self._released))
+
     def __str__(self):
         return self.name
\ No newline at end of file
@@ -1,11 +1,68 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections.abc import Iterator
+from urllib.parse import urlparse, parse_qs
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import threading
 from dotenv import load_dotenv
+from cache import ResponseCache
+from game import Game, ORDER_KEYS
+from jsonstream import decode_page
+from metrics import metrics
+from ratelimit import TokenBucket
+from errors import GameInfoError, APIRequestError, RateLimitError, InvalidAPIKeyError
+from typing import NamedTuple
+
+# results per page returned by the api, and last page it allows to request
+PAGE_SIZE = 20
+MAX_PAGE = 100
+
+
+class BatchResult(NamedTuple):
+    """results of GameInfo.batch by query spec, and the error of each query that failed"""
+    results: dict[tuple, list[dict]]
+    errors: dict[tuple, GameInfoError]
+
 
 class GameInfo:
     """GameInfo class is an implementation of the api RAWG to get informatimon of every game"""
 
-    def __init__(self):
+    # shared by every GameInfo of the process: one quota, one set of requests in flight
+    _limiter = TokenBucket(rate=10, capacity=20)
+    _in_flight: dict[tuple, Future] = {}
+    _in_flight_lock = threading.Lock()
+
+    @classmethod
+    def set_rate_limit(cls, rate: float, capacity: int = None):
+        """
+        sets the requests per second allowed to every GameInfo of the process
+
+        :param rate: requests per second. ``None`` disables the limit
+        :type rate: float
+        :param capacity: requests allowed in a burst. Defaults to ``rate``
+        :type capacity: int
+
+        """
+        cls._limiter = TokenBucket(rate, capacity) if rate else None
+
+    def __init__(self, timeout: tuple = (3.05, 10), retries: int = 3, backoff_factor: float = 0.5, pool_size: int = 10, cache: ResponseCache = None, url: str = "https://api.rawg.io/api/games"):
+        """
+        :param timeout: connect and read timeouts in seconds. Defaults to ``(3.05, 10)``
+        :type timeout: tuple[float, float]
+        :param retries: maximum number of retries on connection errors, 429 and 5xx responses. Defaults to ``3``
+        :type retries: int
+        :param backoff_factor: exponential backoff between retries (factor * 2 ** (retry - 1) seconds). Defaults to ``0.5``
+        :type backoff_factor: float
+        :param pool_size: number of keep-alive connections kept open to the api. Defaults to ``10``
+        :type pool_size: int
+        :param cache: optional response cache. Repeated payloads are answered from it without a request. Defaults to ``None``
+        :type cache: ResponseCache
+        :param url: games endpoint of the api. Defaults to ``https://api.rawg.io/api/games``
+        :type url: str
+
+        """
         # if file e.env doesn't exist then raise a generic error.
         if not load_dotenv("e.env"):
             raise SystemExit("file e.env doesn't exist. Please read instructions from README.md")
@@ -13,7 +70,7 @@ class GameInfo:
         # load the api key from the env variable
         self._api_key = os.getenv("API_KEY")
 
-        self._url = "https://api.rawg.io/api/games"
+        self._url = url
         self._genres = [
             "action",
             "indie",
@@ -36,14 +93,24 @@ class GameInfo:
             "educational1"
 
         ]
-        self._ordering_keywords = [
-            "metacritic",
-            "-metacritic",
-            "name",
-            "-name",
-            "released",
-            "-released"
-        ]
+        self._ordering_keywords = [ordering for field in ORDER_KEYS for ordering in (field, "-" + field)]
+
+        self._timeout = timeout
+        self._cache = cache
+        self._pool_size = pool_size
+
+        # one session per object so every request reuses the same keep-alive connections
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
     
     @property
     def url(self):
@@ -61,25 +128,181 @@ class GameInfo:
     def genres(self):
         return self._genres
 
-    def _request(self, payload: dict) -> list[dict]:
-        r = requests.get(self.url, payload)
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def close(self):
+        """closes the pooled connections"""
+        self._session.close()
+
+    def _get(self, payload: dict) -> requests.Response:
+        """makes the request of payload, without the cache, and returns the unparsed response"""
+        if self._limiter:
+            self._limiter.acquire()
+
         try:
-            r.raise_for_status()
-        except requests.HTTPError:
-            raise SystemExit("HTTPError")
-        if r.json().get("error"):
-            raise SystemExit("Invalid API KEY")
-        
-        return r.json()["results"]
+            with metrics.timer("gameinfo_request_seconds"):
+                r = self._session.get(self.url, params=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            metrics.incr("gameinfo_request_errors_total")
+            raise APIRequestError(f"request failed: {e.__class__.__name__}") from e
+
+        metrics.incr("gameinfo_responses_total", status=r.status_code)
+        metrics.incr("gameinfo_response_bytes_total", len(r.content))
+        if r.status_code == 429:
+            retry_after = r.headers.get("Retry-After")
+            raise RateLimitError("too many requests", retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if r.status_code in (401, 403):
+            raise InvalidAPIKeyError("Invalid API KEY")
+        if not r.ok:
+            raise APIRequestError(f"HTTPError {r.status_code}", status=r.status_code)
+        return r
+
+    def _fetch(self, payload: dict) -> dict:
+        """
+        returns the whole parsed response of payload, from the cache when possible.
+        Concurrent calls with the same payload share a single request.
+        """
+        if self.cache:
+            data = self.cache.get(payload)
+            if data is not None:
+                metrics.incr("gameinfo_cache_hits_total")
+                return data
+            metrics.incr("gameinfo_cache_misses_total")
+
+        key = (self.url, ResponseCache.key(payload))
+        with self._in_flight_lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+
+        if not leader:
+            metrics.incr("gameinfo_coalesced_total")
+            return flight.result()
+
+        try:
+            data = self._fetch_uncached(payload)
+            flight.set_result(data)
+            return data
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+    def _fetch_uncached(self, payload: dict) -> dict:
+        r = self._get(payload)
+
+        # parse the body only once, keeping only the fields of Game
+        try:
+            with metrics.timer("gameinfo_parse_seconds"):
+                data = decode_page(r.content)
+        except ValueError:
+            raise APIRequestError("Invalid response from the api", status=r.status_code) from None
+        if data.get("error"):
+            raise InvalidAPIKeyError("Invalid API KEY")
+
+        if self.cache:
+            self.cache.set(payload, data)
+        return data
+
+    def _request(self, payload: dict) -> list[dict]:
+        return self._fetch(payload)["results"]
+
+    def _next_payload(self, payload: dict, next_url: str) -> dict:
+        """returns the payload of the page linked by next_url, or None if there are no more pages"""
+        if not next_url:
+            return None
+
+        query = {k: v[0] for k, v in parse_qs(urlparse(next_url).query).items()}
+        if int(query.get("page", 1)) > MAX_PAGE:
+            return None
+        # the key in the link is never trusted, the payload keeps our own
+        query.pop("key", None)
+        return {**payload, **query}
+
+    def _iter_pages(self, payload: dict, cached: bool = True, prefetch: bool = True) -> Iterator[list[dict]]:
+        """
+        yields the results of payload page by page following the ``next`` link.
+        The following page is fetched in background while the current one is consumed, unless
+        prefetch is False: then a page is only requested when it is asked for.
+        With cached=False every page is requested, and the cache refreshed with it.
+        """
+        fetch = self._fetch if cached else self._fetch_uncached
+        if not prefetch:
+            while payload:
+                data = fetch(payload)
+                payload = self._next_payload(payload, data.get("next"))
+                yield data["results"]
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(fetch, payload)
+            while future:
+                data = future.result()
+                payload = self._next_payload(payload, data.get("next"))
+                future = executor.submit(fetch, payload) if payload else None
+                yield data["results"]
+
+    def _iter_games(self, payload: dict) -> Iterator[Game]:
+        for results in self._iter_pages(payload):
+            yield from Game.from_api_many(results)
 
     def _check_page_number(self, n: int):
-        if not 1 <= n <= 100:
+        if not 1 <= n <= MAX_PAGE:
             raise ValueError("Invalid page number")
         
     def _check_ordering_method(self, name: str):
         if name not in self.ordering_keywords:
             raise ValueError("Invalid ordering method")
 
+    # Payloads. They validate the arguments and raise a ValueError before any request is made
+
+    def _name_payload(self, name: str) -> dict:
+        name = name.strip()
+
+        return {"key": self.api_key, "search": name}
+
+    def _metacritic_payload(self, score: tuple, ordering: str="-metacritic", page: int=1) -> dict:
+        min, max = score
+        if not 0 <= min <= 100 and 0 <= max <= 100:
+            raise ValueError("Invalid metacritic score")
+        
+        # raises a ValueError if the page number is out of range
+        self._check_page_number(page)        
+        # raises a ValueError if the ordering method is invalid
+        self._check_ordering_method(ordering)
+        
+        return {"key":self.api_key, "metacritic": ",".join((str(min), str(max))), "ordering": ordering, "page": page}
+
+    def _genre_payload(self, genre: str, ordering: str="-metacritic", page: int=1) -> dict:
+        if genre not in self.genres:
+            raise ValueError("Invalid genre")
+        
+        # raises a ValueError if the page number is out of range
+        self._check_page_number(page)        
+        # raises a ValueError if the ordering method is invalid
+        self._check_ordering_method(ordering)
+
+        return {"key":self.api_key, "genres": genre, "ordering": ordering, "page": page}
+
+    def _dates_payload(self, dates: tuple, ordering: str="-metacritic", page: int=1) -> dict:
+        # raises a ValueError if the page number is out of range
+        self._check_page_number(page)        
+        # raises a ValueError if the ordering method is invalid
+        self._check_ordering_method(ordering)
+
+        return {"key":self.api_key, "dates":",".join(dates), "ordering": ordering, "page": page}
+
+    # Search methods
+
     def search_by_name(self, name: str) -> list[dict]:
         """
         search games by name
@@ -90,10 +313,7 @@ class GameInfo:
         :rtype: list
 
         """
-        name = name.strip()
-
-        payload = {"key": self.api_key, "search": name}
-        return self._request(payload)
+        return self._request(self._name_payload(name))
     
     def search_by_metacritic(self, score: tuple, ordering: str="-metacritic", page:int=1) -> list[dict]:
         
@@ -110,18 +330,7 @@ class GameInfo:
         :rtype: list
 
         """
-        min, max = score
-        if not 0 <= min <= 100 and 0 <= max <= 100:
-            raise ValueError("Invalid metacritic score")
-        
-        # raises a ValueError if the page number is out of range
-        self._check_page_number(page)        
-        # raises a ValueError if the ordering method is invalid
-        self._check_ordering_method(ordering)
-        
-        payload = {"key":self.api_key, "metacritic": ",".join((str(min), str(max))), "ordering": ordering, "page": page}
-
-        return self._request(payload)
+        return self._request(self._metacritic_payload(score, ordering, page))
 
     def search_by_genre(self, genre: str, ordering: str="-metacritic", page:int=1) -> list[dict]:
         """
@@ -137,18 +346,7 @@ class GameInfo:
         :rtype: list
 
         """
-
-        if genre not in self.genres:
-            raise ValueError("Invalid genre")
-        
-        # raises a ValueError if the page number is out of range
-        self._check_page_number(page)        
-        # raises a ValueError if the ordering method is invalid
-        self._check_ordering_method(ordering)
-
-        payload = {"key":self.api_key, "genres": genre, "ordering": ordering, "page": page}
-
-        return self._request(payload)
+        return self._request(self._genre_payload(genre, ordering, page))
     
     def search_by_dates(self, dates: tuple, ordering: str="-metacritic", page:int=1) -> list[dict]:
         """
@@ -164,12 +362,100 @@ class GameInfo:
         :rtype: list[dict]
 
         """
+        return self._request(self._dates_payload(dates, ordering, page))
 
-        # raises a ValueError if the page number is out of range
-        self._check_page_number(page)        
-        # raises a ValueError if the ordering method is invalid
-        self._check_ordering_method(ordering)
+    # Batches
+
+    def _spec_payload(self, spec: tuple) -> dict:
+        """returns the payload of a query spec of batch(). Raises ValueError if the spec is not valid"""
+        builders = {
+            "name": self._name_payload,
+            "metacritic": self._metacritic_payload,
+            "genre": self._genre_payload,
+            "dates": self._dates_payload
+        }
+        if not isinstance(spec, tuple) or not spec or spec[0] not in builders:
+            raise ValueError(f"Invalid query spec: {spec!r}")
+        # specs key the results: a list inside a spec would only fail once the requests are done
+        try:
+            hash(spec)
+        except TypeError:
+            raise ValueError(f"Invalid query spec {spec!r}: use tuples, not lists") from None
+        try:
+            return builders[spec[0]](*spec[1:])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid query spec {spec!r}: {e}") from None
+
+    def batch(self, specs: list[tuple], workers: int = None) -> BatchResult:
+        """
+        runs many searches concurrently in one call. Every spec is validated before any request is made
+        and repeated queries are requested once. A failed query doesn't stop the others: its error
+        is returned in BatchResult.errors.
+
+        Usage example:
+            game_info.batch([("genre", genre, "-metacritic") for genre in game_info.genres])
+
+        :param specs: queries as tuples of the kind of search and its arguments, like the search_by_* methods:
+            ("name", name), ("metacritic", score, ordering, page), ("genre", genre, ordering, page)
+            or ("dates", dates, ordering, page). Ordering and page are optional
+        :type specs: list[tuple]
+        :param workers: requests in flight. Defaults to the pool size
+        :type workers: int
+        :returns: results and errors keyed by spec
+        :rtype: BatchResult
+
+        """
+        # specs giving the same payload share a request
+        queries: dict[str, tuple[dict, list[tuple]]] = {}
+        for spec in specs:
+            payload = self._spec_payload(spec)
+            queries.setdefault(ResponseCache.key(payload), (payload, []))[1].append(spec)
+
+        results, errors = {}, {}
+        if not queries:
+            return BatchResult(results, errors)
+
+        metrics.incr("gameinfo_batch_queries_total", len(queries))
+        with ThreadPoolExecutor(max_workers=min(workers or self._pool_size, len(queries))) as executor:
+            futures = {executor.submit(self._request, payload): same for payload, same in queries.values()}
+            for future, same in futures.items():
+                try:
+                    games = future.result()
+                except GameInfoError as e:
+                    metrics.incr("gameinfo_batch_errors_total")
+                    errors.update(dict.fromkeys(same, e))
+                else:
+                    results.update(dict.fromkeys(same, games))
+        return BatchResult(results, errors)
 
-        payload = {"key":self.api_key, "dates":",".join(dates), "ordering": ordering, "page": page}
+    # Iterators. They yield Game objects lazily, keeping at most two pages in memory
 
-        return self._request(payload)
+    def iter_search(self, name: str) -> Iterator[Game]:
+        """
+        iterates over every game matching the keyword 'name'
+
+        :param name: keyword to search
+        :type name: str
+        :returns: an iterator of games, following the pages of results
+        :rtype: Iterator[Game]
+
+        """
+        return self._iter_games(self._name_payload(name))
+
+    def iter_metacritic(self, score: tuple, ordering: str="-metacritic", page: int=1) -> Iterator[Game]:
+        """
+        iterates over every game in the metacritic score range, starting from 'page'. See search_by_metacritic()
+        """
+        return self._iter_games(self._metacritic_payload(score, ordering, page))
+
+    def iter_genre(self, genre: str, ordering: str="-metacritic", page: int=1) -> Iterator[Game]:
+        """
+        iterates over every game of the genre, starting from 'page'. See search_by_genre()
+        """
+        return self._iter_games(self._genre_payload(genre, ordering, page))
+
+    def iter_dates(self, dates: tuple, ordering: str="-metacritic", page: int=1) -> Iterator[Game]:
+        """
+        iterates over every game in the range of dates, starting from 'page'. See search_by_dates()
+        """
+        return self._iter_games(self._dates_payload(dates, ordering, page))
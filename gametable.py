@@ -0,0 +1,256 @@
+from array import array
+from collections.abc import Iterable
+from datetime import date
+from game import Game
+
+# optional: vectorized operations when numpy is installed, plain loops over the arrays otherwise
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Mask(list):
+    """
+    boolean mask of the rows of a GameTable when numpy is not installed. Like a numpy boolean
+    array, masks combine element-wise with &, | and ~
+    """
+    def _combine(self, other, combine) -> "Mask":
+        if len(other) != len(self):
+            raise ValueError("Masks of different lengths")
+        return Mask(combine(a, b) for a, b in zip(self, other))
+
+    def __and__(self, other):
+        return self._combine(other, lambda a, b: bool(a and b))
+
+    def __or__(self, other):
+        return self._combine(other, lambda a, b: bool(a or b))
+
+    __rand__ = __and__
+    __ror__ = __or__
+
+    def __invert__(self):
+        return Mask(not a for a in self)
+
+
+def date_to_days(released: str) -> int:
+    """returns the date YYYY-MM-DD as days since 0001-01-01 (date.toordinal), or 0 if there is no date"""
+    if not released:
+        return 0
+    try:
+        return date.fromisoformat(released).toordinal()
+    except ValueError:
+        return 0
+
+
+def days_to_date(days: int) -> str:
+    return date.fromordinal(days).isoformat() if days else None
+
+
+class GameTable:
+    """
+    Columnar table of games: names and urls as lists, release dates (days), metacritic scores
+    and genre bitmasks as typed arrays. Row-wise Game objects are only built on demand.
+
+    Operations returning a mask (is_recent, is_high_score) work on a whole column at once
+    and masks can be combined with &, | and ~: numpy boolean arrays when numpy is installed,
+    Mask lists otherwise.
+
+    Usage example:
+        table = GameTable.from_favorites(favorites)
+        recent_hits = table.filter(table.is_recent(2) & table.is_high_score(85))
+        recent_hits.sort("-metacritic").to_games()
+
+    """
+
+    # typecodes of the numeric columns: 32 bit days, 16 bit scores (-1: no score), 64 bit genre masks
+    _typecodes = {"released": "i", "metacritic": "h", "genres": "Q"}
+
+    def __init__(self, genre_bits: dict[str, int] = None):
+        self._names: list[str] = []
+        self._urls: list[str] = []
+        self._released = array("i")
+        self._metacritic = array("h")
+        self._genres = array("Q")
+
+        # genre name -> bit of the genre masks. Shared by tables derived from this one
+        self._genre_bits = genre_bits if genre_bits is not None else {}
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def names(self):
+        return self._names
+
+    @property
+    def urls(self):
+        return self._urls
+
+    @property
+    def released(self):
+        return self._released
+
+    @property
+    def metacritic(self):
+        return self._metacritic
+
+    @property
+    def genres(self):
+        return self._genres
+
+    @property
+    def genre_bits(self):
+        return self._genre_bits
+
+    # Construction
+
+    @classmethod
+    def from_games(cls, games: Iterable[Game]) -> "GameTable":
+        table = cls()
+        table.extend(games)
+        return table
+
+    @classmethod
+    def from_api(cls, pages: Iterable[list[dict]]) -> "GameTable":
+        """builds a table from pages of GameInfo results (ie: AsyncGameInfo.fetch_pages or GameInfo._iter_pages)"""
+        table = cls()
+        for results in pages:
+            table.extend(Game.from_api_many(results))
+        return table
+
+    @classmethod
+    def from_favorites(cls, favorites) -> "GameTable":
+        return cls.from_games(favorites)
+
+    def _genre_mask(self, genres: Iterable[str]) -> int:
+        mask = 0
+        for genre in genres:
+            bit = self._genre_bits.get(genre)
+            if bit is None:
+                if len(self._genre_bits) == 64:
+                    raise ValueError("GameTable supports at most 64 genres")
+                bit = self._genre_bits[genre] = len(self._genre_bits)
+            mask |= 1 << bit
+        return mask
+
+    def append(self, game: Game):
+        self._names.append(game.name)
+        self._urls.append(game.background_url)
+        self._released.append(date_to_days(game.released))
+        self._metacritic.append(game.metacritic if game.metacritic is not None else -1)
+        self._genres.append(self._genre_mask(game.genres))
+
+    def extend(self, games: Iterable[Game]):
+        for game in games:
+            self.append(game)
+
+    # Rows
+
+    def game(self, i: int) -> Game:
+        """returns row i as a Game"""
+        genres = tuple(genre for genre, bit in self._genre_bits.items() if self._genres[i] >> bit & 1)
+        score = self._metacritic[i]
+        return Game(self._names[i], days_to_date(self._released[i]), genres, score if score >= 0 else None, self._urls[i])
+
+    def to_games(self) -> list[Game]:
+        return [self.game(i) for i in range(len(self))]
+
+    def take(self, rows: Iterable[int]) -> "GameTable":
+        """returns a new table with the given rows, in that order"""
+        rows = list(rows)
+        table = GameTable(self._genre_bits)
+        table._names = [self._names[i] for i in rows]
+        table._urls = [self._urls[i] for i in rows]
+        for column, typecode in self._typecodes.items():
+            source = getattr(self, "_" + column)
+            # numpy can't index an empty column, and there is nothing to gather for no rows
+            if np is not None and len(rows) and len(source):
+                selected = array(typecode, self._view(source)[np.asarray(rows, dtype=np.intp)].tobytes())
+            else:
+                selected = array(typecode, (source[i] for i in rows))
+            setattr(table, "_" + column, selected)
+        return table
+
+    # Vectorized operations
+
+    @staticmethod
+    def _view(column: array):
+        """numpy view of column without copying it, or column itself without numpy"""
+        return np.frombuffer(column, dtype=column.typecode) if np is not None and len(column) else column
+
+    def is_recent(self, year: int = 2, today: date = None):
+        """mask of the games released in the last 'year' years, like project.is_recent"""
+        today = today or date.today()
+        start = date(today.year - year, 1, 1).toordinal()
+        released = self._view(self._released)
+        if np is not None and len(released):
+            return released >= start
+        return Mask(days >= start for days in released)
+
+    def is_high_score(self, threshold: int = 80):
+        """mask of the games with a metacritic score of at least threshold, like project.is_high_score"""
+        scores = self._view(self._metacritic)
+        if np is not None and len(scores):
+            return scores >= threshold
+        return Mask(score >= threshold for score in scores)
+
+    def has_genre(self, genre: str):
+        """mask of the games of the genre"""
+        bit = self._genre_bits.get(genre)
+        masks = self._view(self._genres)
+        if bit is None:
+            return Mask([False] * len(self))
+        if np is not None and len(masks):
+            return (masks & np.uint64(1 << bit)) != 0
+        return Mask(bool(mask >> bit & 1) for mask in masks)
+
+    def filter(self, mask) -> "GameTable":
+        """returns the rows where mask is true"""
+        if np is not None:
+            return self.take(np.flatnonzero(np.asarray(mask, dtype=bool)))
+        return self.take(i for i, selected in enumerate(mask) if selected)
+
+    def sort(self, by: str = "released") -> "GameTable":
+        """returns the table ordered by name, released or metacritic. Invert with '-' (-metacritic)"""
+        reverse = by.startswith("-")
+        column = {"name": self._names, "released": self._released, "metacritic": self._metacritic}.get(by.lstrip("-"))
+        if column is None:
+            raise ValueError("Invalid ordering method")
+
+        if np is not None and column is not self._names and len(column):
+            # negated rather than reversed, so equal values keep their order like with sorted()
+            values = self._view(column).astype(np.int64)
+            return self.take(np.argsort(-values if reverse else values, kind="stable"))
+        return self.take(sorted(range(len(self)), key=column.__getitem__, reverse=reverse))
+
+    def group_by_genre(self) -> dict[str, dict]:
+        """returns, for each genre, the number of games and their mean metacritic score (games without score excluded)"""
+        groups = {}
+        scores = self._view(self._metacritic)
+        for genre in self._genre_bits:
+            mask = self.has_genre(genre)
+            if np is not None and len(scores):
+                count = int(np.count_nonzero(mask))
+                scored = scores[mask & (scores >= 0)]
+                mean = float(scored.mean()) if len(scored) else None
+            else:
+                selected = [score for score, selected in zip(scores, mask) if selected]
+                count = len(selected)
+                scored = [score for score in selected if score >= 0]
+                mean = sum(scored) / len(scored) if scored else None
+            groups[genre] = {"count": count, "mean_metacritic": mean}
+        return groups
+
+    def score_histogram(self, bins: int = 10) -> list[int]:
+        """returns the number of games in each of 'bins' equal ranges of metacritic score between 0 and 100"""
+        scores = self._view(self._metacritic)
+        if np is not None and len(scores):
+            counts, _ = np.histogram(scores[scores >= 0], bins=bins, range=(0, 100))
+            return counts.tolist()
+
+        counts = [0] * bins
+        for score in scores:
+            if score >= 0:
+                counts[min(bins - 1, score * bins // 100)] += 1
+        return counts
@@ -0,0 +1,192 @@
+from collections.abc import Iterable
+from game import Game, ORDER_KEYS
+import bisect
+import difflib
+import heapq
+import re
+
+def _tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _bitmap(ids: Iterable[int], size: int) -> int:
+    """returns an int with the bits of ids set"""
+    bits = bytearray(size // 8 + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _ids(bitmap: int) -> list[int]:
+    """returns the positions of the bits set in bitmap, in increasing order"""
+    return [i for i, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == "1"]
+
+
+class GameIndex:
+    """
+    Local full-text and faceted index of games, answering combined queries offline.
+
+    Names are tokenized into an inverted index supporting exact, prefix and fuzzy matches.
+    Genres are kept as bitmaps and release dates and metacritic scores as sorted arrays,
+    so every filter becomes a bitmap and a query is the AND of them.
+
+    Usage example:
+        index = GameIndex()
+        index.add_many(game_info.iter_genre("RPG"))
+        index.query(genres=["RPG"], released=("2015-01-01", "2020-12-31"), metacritic=(85, 100), order_by="released")
+
+    """
+
+    def __init__(self):
+        # doc id -> game. Removed games leave a None
+        self._games: list[Game] = []
+        self._ids: dict[tuple, int] = {}
+
+        # postings: token or genre -> doc ids
+        self._tokens: dict[str, set[int]] = {}
+        self._genres: dict[str, set[int]] = {}
+
+        # structures built from the postings on the first query after a change
+        self._dirty = False
+        self._vocabulary: list[str] = []
+        self._genre_bitmaps: dict[str, int] = {}
+        self._released: list[tuple[str, int]] = []
+        self._metacritic: list[tuple[int, int]] = []
+        self._alive = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, game):
+        return isinstance(game, Game) and game.key in self._ids
+
+    @classmethod
+    def from_games(cls, games: Iterable[Game]) -> "GameIndex":
+        index = cls()
+        index.add_many(games)
+        return index
+
+    def add(self, game: Game):
+        """indexes game. A game already indexed (same name and release date) is replaced"""
+        doc = self._ids.get(game.key)
+        if doc is None:
+            doc = len(self._games)
+            self._games.append(game)
+            self._ids[game.key] = doc
+        else:
+            self._unindex(doc)
+            self._games[doc] = game
+
+        for token in _tokenize(game.name):
+            self._tokens.setdefault(token, set()).add(doc)
+        for genre in game.genres:
+            self._genres.setdefault(genre.lower(), set()).add(doc)
+        self._dirty = True
+
+    def add_many(self, games: Iterable[Game]):
+        for game in games:
+            self.add(game)
+
+    def add_results(self, results: list[dict]):
+        """indexes the results of a GameInfo search"""
+        self.add_many(Game.from_api_many(results))
+
+    def remove(self, game: Game):
+        doc = self._ids.pop(game.key, None)
+        if doc is None:
+            raise ValueError(f"{game} is not in the index")
+        self._unindex(doc)
+        self._games[doc] = None
+        self._dirty = True
+
+    def _unindex(self, doc: int):
+        game = self._games[doc]
+        for postings, values in ((self._tokens, _tokenize(game.name)), (self._genres, [genre.lower() for genre in game.genres])):
+            for value in values:
+                postings[value].discard(doc)
+                if not postings[value]:
+                    del postings[value]
+
+    def _build(self):
+        if not self._dirty:
+            return
+        size = len(self._games)
+        self._vocabulary = sorted(self._tokens)
+        self._genre_bitmaps = {genre: _bitmap(docs, size) for genre, docs in self._genres.items()}
+        self._released = sorted((game.released, doc) for doc, game in enumerate(self._games) if game and game.released)
+        self._metacritic = sorted((game.metacritic, doc) for doc, game in enumerate(self._games) if game and game.metacritic is not None)
+        self._alive = _bitmap(self._ids.values(), size)
+        self._dirty = False
+
+    def _match_token(self, token: str, prefix: bool, fuzzy: bool) -> set[int]:
+        docs = set(self._tokens.get(token, ()))
+        if prefix:
+            start = bisect.bisect_left(self._vocabulary, token)
+            for word in self._vocabulary[start:]:
+                if not word.startswith(token):
+                    break
+                docs |= self._tokens[word]
+        if fuzzy:
+            for word in difflib.get_close_matches(token, self._vocabulary, n=10, cutoff=0.8):
+                docs |= self._tokens[word]
+        return docs
+
+    def _range(self, column: list[tuple], low, high) -> int:
+        """returns the bitmap of the docs with a value between low and high (both included)"""
+        start = bisect.bisect_left(column, (low, -1))
+        end = bisect.bisect_right(column, (high, len(self._games)))
+        return _bitmap((doc for _, doc in column[start:end]), len(self._games))
+
+    def query(self, text: str = None, genres: Iterable[str] = (), released: tuple = None, metacritic: tuple = None,
+              order_by: str = None, limit: int = None, prefix: bool = True, fuzzy: bool = False) -> list[Game]:
+        """
+        returns the indexed games matching every filter given
+
+        :param text: words the name must contain. Each word also matches names with a word starting with it (prefix)
+        :type text: str
+        :param genres: genres the game must have, all of them
+        :type genres: Iterable[str]
+        :param released: date range, both included (ie: ("2015-01-01", "2020-12-31"))
+        :type released: tuple[str, str]
+        :param metacritic: score range, both included (ie: (85, 100))
+        :type metacritic: tuple[int, int]
+        :param order_by: name, released or metacritic. Invert with '-' (-metacritic). Defaults to insertion order
+        :type order_by: str
+        :param limit: maximum number of games returned
+        :type limit: int
+        :param prefix: match words by prefix. Defaults to ``True``
+        :type prefix: bool
+        :param fuzzy: also match words with small typos. Defaults to ``False``
+        :type fuzzy: bool
+        :returns: the games matching the query
+        :rtype: list[Game]
+
+        """
+        self._build()
+        candidates = self._alive
+
+        if text:
+            for token in _tokenize(text):
+                candidates &= _bitmap(self._match_token(token, prefix, fuzzy), len(self._games))
+        for genre in genres:
+            candidates &= self._genre_bitmaps.get(genre.lower(), 0)
+        if released:
+            candidates &= self._range(self._released, *released)
+        if metacritic:
+            candidates &= self._range(self._metacritic, *metacritic)
+
+        games = (self._games[doc] for doc in _ids(candidates))
+        if not order_by:
+            return list(games)[:limit]
+
+        reverse = order_by.startswith("-")
+        key = ORDER_KEYS.get(order_by.lstrip("-"))
+        if key is None:
+            raise ValueError("Invalid ordering method")
+        if limit is None:
+            return sorted(games, key=key, reverse=reverse)
+        return (heapq.nlargest if reverse else heapq.nsmallest)(limit, games, key=key)
+
+    def search(self, text: str, fuzzy: bool = False, limit: int = None) -> list[Game]:
+        """returns the games whose name matches text, like GameInfo.search_by_name but offline"""
+        return self.query(text=text, fuzzy=fuzzy, limit=limit)
@@ -0,0 +1,137 @@
+from collections.abc import Iterable, Iterator
+from game import Game, trim_api_game
+from typing import NamedTuple
+import json
+import time
+
+
+class TransferStats(NamedTuple):
+    """number of games read or written and the seconds it took"""
+    games: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        """games per second"""
+        return self.games / self.seconds if self.seconds else float(self.games)
+
+
+def _encoder():
+    """returns the function encoding an item to bytes: orjson if it is installed, json otherwise"""
+    # imported on first use, orjson pulls in several modules
+    try:
+        import orjson
+        return orjson.dumps
+    except ImportError:
+        return lambda item: json.dumps(item).encode()
+
+
+def _decoder():
+    """returns the function parsing JSON bytes: orjson if it is installed, json otherwise"""
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        return json.loads
+
+
+def decode_page(content: bytes) -> dict:
+    """
+    parses a page of api results keeping only the fields Game needs (see game.trim_api_game).
+    The platforms, stores, tags, screenshots and ratings of every game are dropped right away.
+
+    :raises ValueError: if content is not valid JSON
+    """
+    data = _decoder()(content)
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        data["results"] = [trim_api_game(game) for game in data["results"]]
+    return data
+
+
+def iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """
+    yields the items of the JSON array in the text file f one at a time, reading it in chunks.
+    Memory stays proportional to chunk_size and to the largest item, not to the size of the file.
+
+    :raises json.JSONDecodeError: if the file is not a JSON array
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # skip whitespace and separators
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+            pos += 1
+
+        if pos == len(buf):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+            continue
+
+        if not started:
+            if buf[pos] != "[":
+                raise json.JSONDecodeError("Expecting '['", buf, pos)
+            started = True
+            pos += 1
+            continue
+
+        if buf[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            # the item is complete only when a separator follows it. A number cut
+            # by the end of the chunk (ie: "4.5e" + "3") would decode as a shorter one
+            following = end
+            while following < len(buf) and buf[following].isspace():
+                following += 1
+            truncated = following == len(buf) or buf[following] not in ",]"
+        except json.JSONDecodeError:
+            truncated = True
+
+        if truncated:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if eof:
+                    raise json.JSONDecodeError("Invalid or unterminated array", buf, pos)
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+
+        yield item
+        pos = end
+
+
+def write_json_array(f, items: Iterable[dict]) -> int:
+    """writes items as a JSON array to the binary file f one at a time and returns how many were written"""
+    dumps = _encoder()
+    count = 0
+    f.write(b"[")
+    for item in items:
+        if count:
+            f.write(b", ")
+        f.write(dumps(item))
+        count += 1
+    f.write(b"]")
+    return count
+
+
+def iter_games(filename: str) -> Iterator[Game]:
+    """yields the games of a favorites file one at a time"""
+    # written as UTF-8 whatever the locale (see write_json_array)
+    with open(filename, "r", encoding="utf-8") as f:
+        for game in iter_json_array(f):
+            yield Game.from_json(game)
+
+
+def export_games(f, games: Iterable[Game]) -> TransferStats:
+    """writes games to the binary file f as a favorites JSON array and returns the throughput"""
+    start = time.perf_counter()
+    count = write_json_array(f, (game.to_json() for game in games))
+    return TransferStats(count, time.perf_counter() - start)
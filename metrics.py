@@ -0,0 +1,209 @@
+from collections import deque
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+class Histogram:
+    """latency histogram with cumulative buckets (like prometheus) and a window of recent samples for percentiles"""
+
+    # upper bounds in seconds
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, window: int = 10000):
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._samples = deque(maxlen=window)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    @property
+    def max(self):
+        return self._max
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._samples.append(value)
+        self._count += 1
+        self._sum += value
+        self._max = max(self._max, value)
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """returns (upper bound, observations <= bound) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def percentile(self, p: float) -> float:
+        """p-th percentile (0-100) of the recent samples"""
+        if not self._samples:
+            return 0.0
+        if len(self._samples) == 1:
+            return self._samples[0]
+        import statistics
+        return statistics.quantiles(self._samples, n=100, method="inclusive")[min(98, max(0, int(p) - 1))]
+
+
+class Sink:
+    """
+    receives every metric event as it happens (record) and renders the collected metrics (dump).
+    Subclasses implement one or both.
+    """
+    def record(self, kind: str, name: str, value: float, labels: tuple):
+        pass
+
+    def dump(self, metrics: "Metrics") -> str:
+        return ""
+
+    def close(self):
+        pass
+
+
+class SummarySink(Sink):
+    """human readable table of counters and timers"""
+
+    def dump(self, metrics: "Metrics") -> str:
+        from tabulate import tabulate
+
+        timers = [
+            [_format_name(name, labels), h.count, h.sum * 1000, h.sum / h.count * 1000, h.percentile(50) * 1000, h.percentile(95) * 1000, h.max * 1000]
+            for (name, labels), h in sorted(metrics.histograms.items()) if h.count
+        ]
+        counters = [[_format_name(name, labels), value] for (name, labels), value in sorted(metrics.counters.items())]
+
+        text = []
+        if timers:
+            text.append(tabulate(timers, headers=["timer", "count", "total ms", "mean ms", "p50 ms", "p95 ms", "max ms"], floatfmt=".3f", tablefmt="simple"))
+        if counters:
+            text.append(tabulate(counters, headers=["counter", "value"], tablefmt="simple"))
+        return "\n\n".join(text)
+
+
+class PrometheusSink(Sink):
+    """prometheus text exposition format"""
+
+    def dump(self, metrics: "Metrics") -> str:
+        lines = []
+        for (name, labels), value in sorted(metrics.counters.items()):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), h in sorted(metrics.histograms.items()):
+            for bound, count in h.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class CSVTraceSink(Sink):
+    """writes every event as a row of a CSV file: timestamp, kind, name, value, labels"""
+
+    def __init__(self, filename: str):
+        import csv
+
+        self._file = open(filename, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(["timestamp", "kind", "name", "value", "labels"])
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, value: float, labels: tuple):
+        with self._lock:
+            self._writer.writerow([time.time(), kind, name, value, _format_labels(labels)])
+
+    def close(self):
+        self._file.close()
+
+
+class Metrics:
+    """
+    Registry of counters and timing histograms of the hot paths.
+
+    Usage example:
+        with metrics.timer("gameinfo_request_seconds"):
+            ...
+        metrics.incr("gameinfo_responses_total", status=200)
+        print(SummarySink().dump(metrics))
+
+    """
+    def __init__(self):
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, Histogram] = {}
+        self._sinks: list[Sink] = []
+        self._lock = threading.Lock()
+        self.enabled = True
+
+    @property
+    def counters(self):
+        return self._counters
+
+    @property
+    def histograms(self):
+        return self._histograms
+
+    def add_sink(self, sink: Sink):
+        self._sinks.append(sink)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for sink in self._sinks:
+            sink.record("counter", name, value, key[1])
+
+    def observe(self, name: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+        for sink in self._sinks:
+            sink.record("timer", name, seconds, key[1])
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """times the block and observes it in the histogram name, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def close(self):
+        for sink in self._sinks:
+            sink.close()
+        self._sinks.clear()
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _format_name(name: str, labels: tuple) -> str:
+    return name + _format_labels(labels)
+
+
+# process wide registry used by the instrumented modules
+metrics = Metrics()
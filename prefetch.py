@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import os
+import threading
+
+class Prefetcher:
+    """
+    Runs calls in background threads ahead of time and keeps their futures by key,
+    so the result is ready (or in progress) when it is asked for.
+
+    Usage example:
+        prefetcher = Prefetcher()
+        prefetcher.submit(("genre", "action", 2), game_info.search_by_genre, "action", page=2)
+        games = prefetcher.result(("genre", "action", 2), game_info.search_by_genre, "action", page=2)
+
+    """
+    def __init__(self, workers: int = 2, max_entries: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._futures: OrderedDict[object, Future] = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        """starts fn in background unless key is already prefetched"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = self._executor.submit(fn, *args, **kwargs)
+                # forget the oldest results, they are cached elsewhere if needed
+                while len(self._futures) > self._max_entries:
+                    self._futures.popitem(last=False)
+            return future
+
+    def result(self, key, fn, *args, **kwargs):
+        """returns the result of fn, waiting for its prefetch if there is one. Errors are raised here"""
+        with self._lock:
+            future = self._futures.pop(key, None)
+        if future is None:
+            return fn(*args, **kwargs)
+        return future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ImageCache:
+    """
+    Size bounded directory of downloaded images. The least recently used files are removed
+    when the cache grows over max_bytes.
+    """
+    def __init__(self, directory: str = ".image_cache", max_bytes: int = 50 * 1024 * 1024, workers: int = 4, timeout: float = 10):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def path(self, url: str) -> str:
+        """returns the file of url in the cache (it may not exist yet)"""
+        extension = os.path.splitext(url.split("?")[0])[1][:5]
+        return os.path.join(self._directory, hashlib.sha1(url.encode()).hexdigest() + extension)
+
+    def get(self, url: str) -> str:
+        """returns the cached file of url, or None if it isn't downloaded"""
+        path = self.path(url)
+        # mark it as recently used. A background eviction may remove it at any time
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def download(self, url: str) -> str:
+        """downloads url into the cache, if it isn't there, and returns its file"""
+        path = self.get(url)
+        if path:
+            return path
+
+        from urllib.request import urlopen
+
+        path = self.path(url)
+        tmp = f"{path}.{threading.get_ident()}.part"
+        try:
+            with urlopen(url, timeout=self._timeout) as response, open(tmp, "wb") as f:
+                while chunk := response.read(64 * 1024):
+                    f.write(chunk)
+            os.replace(tmp, path)
+        finally:
+            # a failed download leaves no partial file, eviction doesn't count them
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._evict()
+        return path
+
+    def prefetch(self, urls: list[str]):
+        """downloads urls in background, skipping the cached ones and the ones being downloaded"""
+        for url in urls:
+            if not url or os.path.exists(self.path(url)):
+                continue
+            with self._lock:
+                if url in self._pending:
+                    continue
+                self._pending.add(url)
+            self._executor.submit(self._prefetch_one, url)
+
+    def _prefetch_one(self, url: str):
+        try:
+            self.download(url)
+        except OSError:
+            # a failed prefetch is retried when the image is opened
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+    def _evict(self):
+        with self._lock:
+            files = []
+            for entry in os.scandir(self._directory):
+                if entry.is_file() and not entry.name.endswith(".part"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self._max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
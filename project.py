@@ -1,8 +1,67 @@
-from UI import UI
-from gameinfo import GameInfo
 from datetime import datetime
 
-def main():
+# modules are imported where they are first needed: the interactive menu,
+# the crawl and the api client each pull in heavy dependencies
+
+def main(argv=None):
+    import argparse
+    import atexit
+
+    parser = argparse.ArgumentParser(description="My Game List")
+    parser.add_argument("--profile", action="store_true", help="print timings and counters on exit")
+    parser.add_argument("--profile-format", choices=["summary", "prometheus"], default="summary", help="format of --profile. Defaults to summary")
+    parser.add_argument("--trace", metavar="FILE", help="write every timing and counter to a CSV file")
+    commands = parser.add_subparsers(dest="command")
+
+    crawl_parser = commands.add_parser("crawl", help="download every page of genres and/or years without the interactive menu")
+    crawl_parser.add_argument("--output", default="crawl", help="directory of the output shards and the checkpoint. Defaults to crawl")
+    crawl_parser.add_argument("--genres", nargs="*", help="genres to crawl. Defaults to every genre unless --years is given")
+    crawl_parser.add_argument("--years", type=int, nargs=2, metavar=("FIRST", "LAST"), help="also crawl one date window per year")
+    crawl_parser.add_argument("--ordering", default="-metacritic", help="ordering of the results. Defaults to -metacritic")
+    crawl_parser.add_argument("--concurrency", type=int, default=8, help="requests in flight. Defaults to 8")
+    crawl_parser.add_argument("--workers", type=int, help="decoding processes. Defaults to the number of CPUs")
+    crawl_parser.add_argument("--shard-size", type=int, default=50000, help="rows per output file. Defaults to 50000")
+
+    sync_parser = commands.add_parser("sync", help="refresh a local catalog with the games updated since the last sync")
+    sync_parser.add_argument("--catalog", default="catalog.sqlite", help="SQLite catalog file. Defaults to catalog.sqlite")
+    sync_parser.add_argument("--genres", nargs="*", help="genres to sync. Defaults to every genre unless --years is given")
+    sync_parser.add_argument("--years", type=int, nargs=2, metavar=("FIRST", "LAST"), help="also sync one date window per year")
+    sync_parser.add_argument("--full", action="store_true", help="forget the high-water marks and download everything again")
+
+    serve_parser = commands.add_parser("serve", help="run an HTTP service sharing searches and favorites between clients")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on. Defaults to 127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080, help="port to listen on. Defaults to 8080")
+    serve_parser.add_argument("--concurrency", type=int, default=32, help="requests handled at a time, the rest get 503. Defaults to 32")
+    serve_parser.add_argument("--favorites", default="favorites.json", help="shared favorites file. Defaults to favorites.json")
+
+    sets_parser = commands.add_parser("sets", help="union, intersection or difference of favorites files")
+    sets_parser.add_argument("operation", choices=["union", "intersection", "difference"], help="difference keeps the games of the first file missing from the others")
+    sets_parser.add_argument("files", nargs="+", help="favorites files")
+    sets_parser.add_argument("--output", required=True, help="favorites file of the result")
+    sets_parser.add_argument("--memory-limit", type=int, default=256, help="input size in MB over which files are merged on disk. Defaults to 256")
+    args = parser.parse_args(argv)
+
+    if args.trace or args.profile:
+        from metrics import metrics, SummarySink, PrometheusSink, CSVTraceSink
+    if args.trace:
+        metrics.add_sink(CSVTraceSink(args.trace))
+        atexit.register(metrics.close)
+    if args.profile:
+        sink = SummarySink() if args.profile_format == "summary" else PrometheusSink()
+        atexit.register(lambda: print(sink.dump(metrics)))
+
+    if args.command == "crawl":
+        return crawl(args)
+    if args.command == "sync":
+        return sync(args)
+    if args.command == "serve":
+        return serve(args)
+    if args.command == "sets":
+        from setops import set_operation
+        stats = set_operation(args.operation, args.files, args.output, memory_limit=args.memory_limit * 1024 * 1024)
+        return print(f"{stats.games} games written to {args.output} in {stats.seconds:.1f} s")
+
+    from UI import UI
     ui = UI()
     ui._clear_console()
     while True:
@@ -12,6 +71,82 @@ def main():
             ui.quit()
 
 
+def crawl(args):
+    """runs the crawl subcommand. Running it again with the same output resumes an interrupted crawl"""
+    from gameinfo import GameInfo
+    from crawler import Crawler
+
+    game_info = GameInfo(pool_size=args.concurrency)
+    genres = args.genres
+    if genres is None:
+        genres = [] if args.years else game_info.genres
+    windows = [(f"{year}-01-01", f"{year}-12-31") for year in range(args.years[0], args.years[1] + 1)] if args.years else []
+
+    crawler = Crawler(
+        game_info,
+        args.output,
+        genres=genres,
+        date_windows=windows,
+        ordering=args.ordering,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        shard_size=args.shard_size
+    )
+    stats = crawler.run()
+    print(f"{stats.games} rows in {stats.seconds:.1f} s ({stats.rate:.0f} rows/sec)")
+
+
+def sync(args):
+    """runs the sync subcommand"""
+    from gameinfo import GameInfo
+    from catalog import CatalogStore
+    from sync import Synchronizer
+
+    game_info = GameInfo()
+    genres = args.genres
+    if genres is None:
+        genres = [] if args.years else game_info.genres
+    specs = [("genre", genre) for genre in genres]
+    if args.years:
+        specs += [("dates", (f"{year}-01-01", f"{year}-12-31")) for year in range(args.years[0], args.years[1] + 1)]
+
+    synchronizer = Synchronizer(game_info, CatalogStore(args.catalog))
+    if args.full:
+        for spec in specs:
+            synchronizer.reset(spec)
+    for stats in synchronizer.sync_all(specs):
+        status = "unchanged" if stats.skipped else f"{stats.inserted} inserted, {stats.updated} updated, {stats.unchanged} unchanged"
+        if stats.truncated:
+            status += ", incomplete: too many games updated on one day, the next sync requests them again"
+        print(f"{stats.query}: {status} ({stats.seconds:.1f} s)")
+
+
+def serve(args):
+    """runs the serve subcommand until it is interrupted"""
+    import asyncio
+    import os
+    from cache import ResponseCache
+    from favorites import Favorites
+    from gameinfo import GameInfo
+    from server import GameServer
+
+    # every change is journaled, the favorites file is compacted on exit
+    favorites = Favorites()
+    favorites.filename = args.favorites
+    favorites.enable_journal()
+    if os.path.exists(favorites.filename) or os.path.exists(favorites.journal_filename):
+        favorites.import_json()
+
+    server = GameServer(GameInfo(pool_size=args.concurrency, cache=ResponseCache()), favorites, args.host, args.port, args.concurrency)
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        favorites.export_json()
+
+
 def is_recent(game, year=2):
     """ returns True if the game is recent, false otherwise"""
     released_year = int(game.released.split("-")[0]) # get released year
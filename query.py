@@ -0,0 +1,163 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from game import Game, ORDER_KEYS
+from gameinfo import GameInfo
+from typing import NamedTuple
+import heapq
+
+class Query(NamedTuple):
+    """
+    combined search: every predicate given must match. Date and score ranges include both ends,
+    and one end may be None (ie: released=("2019-01-01", None) for games released after 2018)
+    """
+    genre: str = None
+    released: tuple = None
+    metacritic: tuple = None
+    order_by: str = "-metacritic"
+    limit: int = 50
+
+
+class Plan(NamedTuple):
+    """how a Query runs: the predicate filtered by the api, its result count and the payload of its first page"""
+    server_filter: str
+    count: int
+    payload: dict
+
+
+class QueryResult(NamedTuple):
+    games: list[Game]
+    plan: Plan
+    pages: int
+
+
+class QueryPlanner:
+    """
+    Runs a Query with as few requests as possible.
+
+    The api filters by one predicate: the planner asks the api for the result count of each one
+    and sends the most selective. The ordering is always done by the api, so pages arrive
+    sorted and the other predicates are checked locally as they stream. Pagination stops as soon
+    as the top results are known: once limit games matched, or once the games go past the range
+    of the ordered field.
+
+    Usage example:
+        planner = QueryPlanner(GameInfo())
+        result = planner.run(Query(genre="action", released=("2019-01-01", None), order_by="-metacritic", limit=50))
+
+    """
+
+    def __init__(self, game_info: GameInfo):
+        self._game_info = game_info
+
+    @staticmethod
+    def _date_range(released: tuple) -> tuple[str, str]:
+        """fills the open ends of a date range for the api"""
+        start, end = released
+        return start or "1900-01-01", end or f"{date.today().year + 10}-12-31"
+
+    def _candidates(self, query: Query) -> dict[str, dict]:
+        """returns the payload of page 1 of every predicate the api can filter by. Raises ValueError on invalid predicates"""
+        game_info = self._game_info
+        candidates = {}
+        if query.genre is not None:
+            candidates["genre"] = game_info._genre_payload(query.genre, query.order_by)
+        if query.released is not None:
+            candidates["released"] = game_info._dates_payload(self._date_range(query.released), query.order_by)
+        if query.metacritic is not None:
+            low, high = query.metacritic
+            candidates["metacritic"] = game_info._metacritic_payload((0 if low is None else low, 100 if high is None else high), query.order_by)
+        return candidates
+
+    def plan(self, query: Query) -> Plan:
+        """
+        chooses the predicate sent to the api: the one with fewer results
+
+        :raises ValueError: if a predicate, the ordering or the limit is not valid
+        """
+        if query.limit is not None and query.limit < 1:
+            raise ValueError("Invalid limit")
+        self._game_info._check_ordering_method(query.order_by)
+        candidates = self._candidates(query)
+
+        if not candidates:
+            return Plan(None, None, {"key": self._game_info.api_key, "ordering": query.order_by, "page": 1})
+        if len(candidates) == 1:
+            (name, payload), = candidates.items()
+            return Plan(name, None, payload)
+
+        # a page of one game is enough to read the count of a predicate
+        with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+            counts = dict(zip(candidates, executor.map(lambda payload: self._game_info._fetch({**payload, "page_size": 1})["count"], candidates.values())))
+        name = min(counts, key=counts.get)
+        return Plan(name, counts[name], candidates[name])
+
+    @staticmethod
+    def _in_range(value, bounds: tuple) -> bool:
+        low, high = bounds
+        if value is None:
+            return False
+        return (low is None or value >= low) and (high is None or value <= high)
+
+    def _matches(self, query: Query, game: Game) -> bool:
+        if query.genre is not None and query.genre.lower() not in (genre.lower() for genre in game.genres):
+            return False
+        if query.released is not None and not self._in_range(game.released, query.released):
+            return False
+        if query.metacritic is not None and not self._in_range(game.metacritic, query.metacritic):
+            return False
+        return True
+
+    def _past_range(self, query: Query, game: Game) -> bool:
+        """True if no game after this one, in the order of the results, can match the range of the ordered field"""
+        field = query.order_by.lstrip("-")
+        bounds = {"released": query.released, "metacritic": query.metacritic}.get(field)
+        value = getattr(game, field)
+        if bounds is None or value is None:
+            return False
+        low, high = bounds
+        if query.order_by.startswith("-"):
+            return low is not None and value < low
+        return high is not None and value > high
+
+    def run(self, query: Query) -> QueryResult:
+        """
+        runs query, streaming pages until its result is complete
+
+        :returns: the matching games in the order of the query, at most limit, the plan used and the number of pages requested
+            (the count probes of the plan excluded)
+        :rtype: QueryResult
+
+        """
+        plan = self.plan(query)
+        key = ORDER_KEYS[query.order_by.lstrip("-")]
+        matches = []
+        # games with the ordered field missing are sorted last by the api, they don't prove the top results
+        ranked = 0
+        pages = 0
+
+        # no prefetch: stopping early must not leave a request for a page nobody reads
+        results_pages = self._game_info._iter_pages(plan.payload, prefetch=False)
+        try:
+            for results in results_pages:
+                pages += 1
+                done = False
+                for game in Game.from_api_many(results):
+                    if self._past_range(query, game):
+                        done = True
+                        break
+                    if self._matches(query, game):
+                        matches.append(game)
+                        ranked += getattr(game, query.order_by.lstrip("-")) is not None
+                        if query.limit is not None and ranked >= query.limit:
+                            done = True
+                            break
+                if done:
+                    break
+        finally:
+            results_pages.close()
+
+        if query.limit is None:
+            games = sorted(matches, key=key, reverse=query.order_by.startswith("-"))
+        else:
+            games = (heapq.nlargest if query.order_by.startswith("-") else heapq.nsmallest)(query.limit, matches, key=key)
+        return QueryResult(games, plan, pages)
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    Token bucket rate limiter usable from threads and from asyncio tasks.
+
+    Every call to acquire takes one token. Tokens refill at ``rate`` per second up to ``capacity``.
+    When the bucket is empty the caller reserves the next token and waits until it is available,
+    so callers are served in the order they arrived.
+
+    Usage example:
+        bucket = TokenBucket(rate=5)
+        bucket.acquire()            # in a thread
+        await bucket.acquire_async()  # in a coroutine
+
+    """
+    def __init__(self, rate: float, capacity: int = None):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+
+        self._rate = rate
+        self._capacity = capacity if capacity else max(1, int(rate))
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _reserve(self) -> float:
+        """takes a token and returns the seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
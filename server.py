@@ -0,0 +1,332 @@
+from concurrent.futures import ThreadPoolExecutor
+from errors import GameInfoError, APIRequestError, RateLimitError, InvalidAPIKeyError
+from favorites import Favorites
+from game import Game
+from gameinfo import GameInfo, PAGE_SIZE
+from metrics import metrics, PrometheusSink
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import json
+import logging
+import time
+
+class HTTPError(Exception):
+    """ends a request with an error status and a JSON body {"error": message}"""
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class GameServer:
+    """
+    Headless asyncio HTTP service exposing the searches of GameInfo and a shared favorites list as JSON.
+
+    Every client shares one GameInfo: its pooled session, response cache, rate limiter and
+    request coalescing. At most ``concurrency`` requests are handled at a time, further
+    requests are answered right away with 503 so clients back off instead of piling up.
+
+    Endpoints:
+        GET    /search/name?name=portal
+        GET    /search/metacritic?min=90&max=100&ordering=-metacritic&page=1
+        GET    /search/genre?genre=RPG&ordering=-released&page=2
+        GET    /search/dates?start=2020-01-01&end=2020-12-31&page=1
+        GET    /favorites?start=0&limit=50
+        POST   /favorites                              body: a game as in favorites.json
+        DELETE /favorites?name=Portal&released=2007-10-09
+        GET    /stats                                  latency per endpoint
+        GET    /metrics                                prometheus text format
+
+    Usage example:
+        server = GameServer(GameInfo(cache=ResponseCache()), port=8080)
+        asyncio.run(server.serve_forever())
+
+    """
+
+    # reasons of the statuses the server answers with
+    _reasons = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                409: "Conflict", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+                500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+    # largest header section accepted, in bytes, the request line included
+    _max_header = 64 * 1024
+
+    def __init__(self, game_info: GameInfo = None, favorites: Favorites = None, host: str = "127.0.0.1", port: int = 8080,
+                 concurrency: int = 32, idle_timeout: float = 30, max_body: int = 1 << 20):
+        """
+        :param game_info: client shared by every request. Defaults to a GameInfo with a pool of size ``concurrency``
+        :type game_info: GameInfo
+        :param favorites: favorites list shared by every client. Defaults to an empty Favorites
+        :type favorites: Favorites
+        :param host: address to listen on. Defaults to ``127.0.0.1``
+        :type host: str
+        :param port: port to listen on, 0 picks a free one. Defaults to ``8080``
+        :type port: int
+        :param concurrency: requests handled at a time. Defaults to ``32``
+        :type concurrency: int
+        :param idle_timeout: seconds a keep-alive connection may stay idle. Defaults to ``30``
+        :type idle_timeout: float
+        :param max_body: largest request body accepted, in bytes. Defaults to 1 MB
+        :type max_body: int
+
+        """
+        self._game_info = game_info if game_info else GameInfo(pool_size=concurrency)
+        self._favorites = favorites if favorites is not None else Favorites()
+        self._host = host
+        self._port = port
+        self._concurrency = concurrency
+        self._idle_timeout = idle_timeout
+        self._max_body = max_body
+        self._server: asyncio.AbstractServer = None
+        self._slots: asyncio.Semaphore = None
+        self._favorites_lock: asyncio.Lock = None
+
+        self._routes = {
+            ("GET", "/search/name"): self._search_by_name,
+            ("GET", "/search/metacritic"): self._search_by_metacritic,
+            ("GET", "/search/genre"): self._search_by_genre,
+            ("GET", "/search/dates"): self._search_by_dates,
+            ("GET", "/favorites"): self._list_favorites,
+            ("POST", "/favorites"): self._add_favorite,
+            ("DELETE", "/favorites"): self._remove_favorite,
+            ("GET", "/stats"): self._stats,
+            ("GET", "/metrics"): self._metrics
+        }
+
+    @property
+    def game_info(self):
+        return self._game_info
+
+    @property
+    def favorites(self):
+        return self._favorites
+
+    @property
+    def port(self):
+        """port the server listens on, known once it started"""
+        return self._server.sockets[0].getsockname()[1] if self._server else self._port
+
+    async def start(self):
+        # upstream requests block a worker thread each: one per request slot
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(self._concurrency, thread_name_prefix="server"))
+        self._slots = asyncio.Semaphore(self._concurrency)
+        self._favorites_lock = asyncio.Lock()
+        self._server = await asyncio.start_server(self._handle_connection, self._host, self._port)
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    # HTTP
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self._idle_timeout)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, False, e.headers)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, content, extra_headers = await self._dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, content, keep_alive, extra_headers)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> bytes:
+        try:
+            return await reader.readline()
+        except ValueError:
+            # the line is longer than the limit of the reader
+            raise HTTPError(431, "Header too large")
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> tuple:
+        """returns (method, target, headers, body) of the next request, or None if the client closed the connection"""
+        line = await self._readline(reader)
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        size = len(line)
+        while (line := await self._readline(reader)) not in (b"\r\n", b"\n", b""):
+            # each line is bounded by the reader, the number of lines is bounded here
+            size += len(line)
+            if size > self._max_header:
+                raise HTTPError(431, "Header too large")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > self._max_body:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, content, keep_alive: bool, headers: dict = None):
+        if isinstance(content, str):
+            body, content_type = content.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(content).encode(), "application/json"
+        head = [f"HTTP/1.1 {status} {self._reasons.get(status, '')}", f"Content-Type: {content_type}", f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> tuple[int, object, dict]:
+        """runs the handler of the request and returns the status, content and extra headers of the response"""
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        endpoint = f"{method} {url.path}" if handler else "unknown"
+
+        # backpressure: a full server answers right away instead of queueing
+        if self._slots.locked():
+            metrics.incr("server_rejected_total", endpoint=endpoint)
+            return 503, {"error": "Server busy, retry later"}, {"Retry-After": "1"}
+
+        start = time.perf_counter()
+        async with self._slots:
+            try:
+                if handler is None:
+                    allowed = [m for m, path in self._routes if path == url.path]
+                    raise HTTPError(405, "Method not allowed") if allowed else HTTPError(404, "Not found")
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                status, content = await handler(query, body)
+                headers = {}
+            except HTTPError as e:
+                status, content, headers = e.status, {"error": str(e)}, e.headers
+            except Exception as e:
+                status, content, headers = self._error_response(e)
+                if status == 500:
+                    logging.getLogger(__name__).exception("%s %s failed", method, target)
+
+        metrics.observe("server_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+        metrics.incr("server_responses_total", endpoint=endpoint, status=status)
+        return status, content, headers
+
+    @staticmethod
+    def _error_response(error: Exception) -> tuple[int, dict, dict]:
+        if isinstance(error, ValueError):
+            return 400, {"error": str(error)}, {}
+        if isinstance(error, RateLimitError):
+            return 503, {"error": str(error)}, {"Retry-After": str(int(error.retry_after or 1))}
+        if isinstance(error, InvalidAPIKeyError):
+            return 502, {"error": "The api rejected the API KEY"}, {}
+        if isinstance(error, APIRequestError) and error.status == 404:
+            return 404, {"error": str(error)}, {}
+        if isinstance(error, GameInfoError):
+            return 502, {"error": str(error)}, {}
+        return 500, {"error": "Internal server error"}, {}
+
+    # Searches
+
+    @staticmethod
+    def _param(query: dict, name: str, convert=str, default=None):
+        value = query.get(name)
+        if value is None:
+            if default is None:
+                raise HTTPError(400, f"Missing parameter {name}")
+            return default
+        try:
+            return convert(value)
+        except ValueError:
+            raise HTTPError(400, f"Invalid parameter {name}")
+
+    async def _search(self, method: str, *args, page: int = None, **kwargs) -> tuple[int, dict]:
+        search = getattr(self._game_info, method)
+        if page is not None:
+            kwargs["page"] = page
+        results = await asyncio.to_thread(search, *args, **kwargs)
+        games = [game.to_json() for game in Game.from_api_many(results)]
+        more = page is not None and len(games) == PAGE_SIZE
+        return 200, {"page": page or 1, "next": page + 1 if more else None, "results": games}
+
+    async def _search_by_name(self, query: dict, body: bytes):
+        return await self._search("search_by_name", self._param(query, "name"))
+
+    async def _search_by_metacritic(self, query: dict, body: bytes):
+        score = (self._param(query, "min", int), self._param(query, "max", int, 100))
+        return await self._search("search_by_metacritic", score, self._param(query, "ordering", default="-metacritic"), page=self._param(query, "page", int, 1))
+
+    async def _search_by_genre(self, query: dict, body: bytes):
+        return await self._search("search_by_genre", self._param(query, "genre"), self._param(query, "ordering", default="-metacritic"), page=self._param(query, "page", int, 1))
+
+    async def _search_by_dates(self, query: dict, body: bytes):
+        dates = (self._param(query, "start"), self._param(query, "end"))
+        return await self._search("search_by_dates", dates, self._param(query, "ordering", default="-metacritic"), page=self._param(query, "page", int, 1))
+
+    # Favorites
+
+    async def _list_favorites(self, query: dict, body: bytes):
+        start = self._param(query, "start", int, 0)
+        limit = self._param(query, "limit", int, 50)
+        # not while a change is being written
+        async with self._favorites_lock:
+            games = self._favorites.window(start, start + limit)
+            count = len(self._favorites)
+        return 200, {"count": count, "start": start, "results": [game.to_json() for game in games]}
+
+    async def _add_favorite(self, query: dict, body: bytes):
+        try:
+            game = Game.from_json(json.loads(body))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, "Body must be a game: name, released, genres, metacritic, background_url")
+        try:
+            await self._change_favorites(self._favorites.add, game)
+        except ValueError as e:
+            raise HTTPError(409, str(e))
+        return 201, game.to_json()
+
+    async def _remove_favorite(self, query: dict, body: bytes):
+        game = Game(self._param(query, "name"), query.get("released") or None, (), None, None)
+        try:
+            await self._change_favorites(self._favorites.remove, game)
+        except ValueError as e:
+            raise HTTPError(404, str(e))
+        return 200, {"removed": game.name}
+
+    async def _change_favorites(self, change, game: Game):
+        """runs a change of the favorites in a worker thread: it writes the journal, and compacts it now and then.
+        Changes run one at a time"""
+        async with self._favorites_lock:
+            await asyncio.to_thread(change, game)
+
+    # Monitoring
+
+    async def _stats(self, query: dict, body: bytes):
+        stats = {}
+        for (name, labels), histogram in sorted(metrics.histograms.items()):
+            if name == "server_request_seconds" and histogram.count:
+                stats[dict(labels)["endpoint"]] = {
+                    "count": histogram.count,
+                    "mean_ms": histogram.sum / histogram.count * 1000,
+                    "p50_ms": histogram.percentile(50) * 1000,
+                    "p95_ms": histogram.percentile(95) * 1000,
+                    "max_ms": histogram.max * 1000
+                }
+        return 200, stats
+
+    async def _metrics(self, query: dict, body: bytes):
+        return 200, PrometheusSink().dump(metrics)
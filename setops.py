@@ -0,0 +1,157 @@
+from collections.abc import Iterator
+from game import Game
+from itertools import groupby, islice
+from jsonstream import TransferStats, export_games, iter_games
+from storage import atomic_write
+import heapq
+import json
+import os
+import time
+
+# set operations, and whether a game is in the result given in which of the n files it is (its positions)
+OPERATIONS = {
+    "union": lambda files, n: True,
+    "intersection": lambda files, n: len(files) == n,
+    "difference": lambda files, n: files == {0}
+}
+
+
+def _sort_key(game: Game) -> tuple[str, bool, str]:
+    # games without release date sort first. None and "" are different keys: they must not be merged
+    return (game.name, game.released is not None, game.released or "")
+
+
+def _check(operation: str, filenames: list[str]):
+    if operation not in OPERATIONS:
+        raise ValueError(f"Invalid set operation, use one of {', '.join(OPERATIONS)}")
+    if not filenames:
+        raise ValueError("At least one favorites file is required")
+
+
+# In memory: hash on Game.key
+
+def hash_operation(operation: str, filenames: list[str]) -> Iterator[Game]:
+    """
+    yields the games of the set operation on the favorites files, in order of first appearance.
+    Only the games of the result so far are kept in memory (the keys of the other files for union).
+    difference is the games of the first file missing from every other file.
+    """
+    _check(operation, filenames)
+    first, others = filenames[0], filenames[1:]
+
+    if operation == "union":
+        seen = set()
+        for filename in filenames:
+            for game in iter_games(filename):
+                if game.key not in seen:
+                    seen.add(game.key)
+                    yield game
+        return
+
+    result = {}
+    for game in iter_games(first):
+        result.setdefault(game.key, game)
+    for filename in others:
+        if operation == "intersection":
+            keys = {game.key for game in iter_games(filename) if game.key in result}
+            result = {key: game for key, game in result.items() if key in keys}
+        else:
+            for game in iter_games(filename):
+                result.pop(game.key, None)
+        if not result:
+            break
+    yield from result.values()
+
+
+# Larger than memory: sorted runs on disk, merged
+
+def _write_run(games: list[Game], filename: str):
+    games.sort(key=_sort_key)
+    with open(filename, "w", encoding="utf-8") as f:
+        for game in games:
+            f.write(json.dumps(game.to_json()) + "\n")
+
+
+def _read_run(filename: str) -> Iterator[Game]:
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            yield Game.from_json(json.loads(line))
+
+
+def _sorted_runs(filename: str, directory: str, prefix: str, run_size: int) -> list[str]:
+    """splits a favorites file into files of at most run_size games sorted by key, and returns their names"""
+    runs = []
+    games = iter_games(filename)
+    while chunk := list(islice(games, run_size)):
+        run = os.path.join(directory, f"{prefix}-{len(runs)}.jsonl")
+        _write_run(chunk, run)
+        runs.append(run)
+    return runs
+
+
+def _merged(runs: list[str]) -> Iterator[Game]:
+    """merges sorted runs into one sorted stream without repeated keys"""
+    for _, same in groupby(heapq.merge(*map(_read_run, runs), key=_sort_key), key=_sort_key):
+        yield next(same)
+
+
+def _tagged(games: Iterator[Game], position: int) -> Iterator[tuple]:
+    """tags a sorted stream with its file position, keys are unique in a stream so games are never compared"""
+    for game in games:
+        yield _sort_key(game), position, game
+
+
+def external_operation(operation: str, filenames: list[str], directory: str = None, run_size: int = 100_000) -> Iterator[Game]:
+    """
+    yields the games of the set operation on the favorites files ordered by name and release date.
+    Each file is cut into sorted runs of run_size games written to directory, then every run of
+    every file is merged at once: memory is bounded by run_size, not by the size of the files.
+    """
+    import tempfile
+
+    _check(operation, filenames)
+    accepts = OPERATIONS[operation]
+    with tempfile.TemporaryDirectory(dir=directory, prefix="setops-") as tmp:
+        streams = []
+        for position, filename in enumerate(filenames):
+            streams.append(_tagged(_merged(_sorted_runs(filename, tmp, f"run-{position}", run_size)), position))
+
+        for _, entries in groupby(heapq.merge(*streams), key=lambda entry: entry[0]):
+            entries = list(entries)
+            if accepts({position for _, position, _ in entries}, len(filenames)):
+                # the game as stored in the first file having it
+                yield entries[0][2]
+
+
+def set_operation(operation: str, filenames: list[str], output: str, memory_limit: int = 256 * 1024 * 1024,
+                  directory: str = None, run_size: int = 100_000) -> TransferStats:
+    """
+    writes the union, intersection or difference of favorites files to a new favorites file.
+    Games are the same when their name and release date are (Game.key).
+
+    :param operation: union, intersection or difference (games of the first file missing from the others)
+    :type operation: str
+    :param filenames: favorites files
+    :type filenames: list[str]
+    :param output: favorites file of the result, written atomically while the result is computed
+    :type output: str
+    :param memory_limit: input size in bytes over which the external sort-merge is used. Defaults to 256 MB
+    :type memory_limit: int
+    :param directory: directory of the temporary sorted runs. Defaults to the system temporary directory
+    :type directory: str
+    :param run_size: games per sorted run. Defaults to ``100000``
+    :type run_size: int
+    :returns: number of games written and time taken
+    :rtype: TransferStats
+
+    """
+    _check(operation, filenames)
+    start = time.perf_counter()
+    if sum(os.path.getsize(filename) for filename in filenames) <= memory_limit:
+        games = hash_operation(operation, filenames)
+    else:
+        games = external_operation(operation, filenames, directory, run_size)
+
+    with atomic_write(output, "wb") as f:
+        count = export_games(f, games).games
+    return TransferStats(count, time.perf_counter() - start)
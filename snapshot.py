@@ -0,0 +1,194 @@
+from array import array
+from collections.abc import Iterable, Iterator
+from game import Game
+from gametable import GameTable, days_to_date
+from jsonstream import TransferStats, export_games, iter_games
+from storage import atomic_write
+import mmap
+import struct
+import sys
+import time
+
+# file layout, every section starts at a multiple of 8 bytes and numbers are little endian:
+#   header      magic, version, number of genres, number of rows
+#   released    int32 per row, days since 0001-01-01 (0: no date)
+#   metacritic  int16 per row (-1: no score)
+#   genres      uint64 per row, bit i set if the game has genre i
+#   offsets     uint64 per string + 1, start of each string in the string table
+#   strings     UTF-8 name and background url of every row, then the genre names
+_HEADER = struct.Struct("<8sHHI")
+_MAGIC = b"MGLSNAP\x00"
+_VERSION = 1
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _layout(rows: int, genres: int) -> dict[str, tuple[int, int]]:
+    """returns the offset and size of every section of a snapshot"""
+    sections = {}
+    offset = _align(_HEADER.size)
+    for name, size in (("released", 4 * rows), ("metacritic", 2 * rows), ("genres", 8 * rows), ("offsets", 8 * (2 * rows + genres + 1))):
+        sections[name] = (offset, size)
+        offset = _align(offset + size)
+    sections["strings"] = (offset, None)
+    return sections
+
+
+def _check_byteorder():
+    # columns are cast straight from the file: only little endian machines read them as written
+    if sys.byteorder != "little":
+        raise OSError("snapshots require a little endian machine")
+
+
+def write_snapshot(filename: str, games: Iterable[Game]) -> TransferStats:
+    """
+    writes games to a binary snapshot file, atomically
+
+    :param filename: snapshot file
+    :type filename: str
+    :param games: games to write, at most 64 different genres
+    :type games: Iterable[Game]
+    :returns: number of games written and time taken
+    :rtype: TransferStats
+
+    """
+    _check_byteorder()
+    start = time.perf_counter()
+    table = GameTable.from_games(games)
+    rows, genres = len(table), len(table.genre_bits)
+    layout = _layout(rows, genres)
+
+    strings = []
+    for name, url in zip(table.names, table.urls):
+        strings.append(name.encode())
+        strings.append((url or "").encode())
+    # genre_bits keeps insertion order: bit i is the i-th genre
+    strings.extend(genre.encode() for genre in table.genre_bits)
+    offsets = array("Q", [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+
+    with atomic_write(filename, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, genres, rows))
+        for section, column in (("released", table.released), ("metacritic", table.metacritic), ("genres", table.genres), ("offsets", offsets)):
+            f.write(bytes(layout[section][0] - f.tell()))
+            f.write(column.tobytes())
+        f.write(bytes(layout["strings"][0] - f.tell()))
+        f.writelines(strings)
+
+    return TransferStats(rows, time.perf_counter() - start)
+
+
+class Snapshot:
+    """
+    Read-only binary snapshot of games, opened with mmap.
+
+    Opening it only reads the header and the genre names: columns are typed views over the
+    mapped file and a Game is decoded only when a row is accessed. Processes opening the same
+    snapshot share its pages in the OS page cache.
+
+    Usage example:
+        write_snapshot("catalog.snap", catalog.query())
+        with Snapshot("catalog.snap") as snapshot:
+            print(len(snapshot), snapshot[0])
+
+    """
+    def __init__(self, filename: str):
+        _check_byteorder()
+        self._filename = filename
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, genres, rows = _HEADER.unpack_from(self._mmap)
+        except struct.error:
+            self._mmap.close()
+            raise ValueError(f"{filename} is not a snapshot") from None
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f"{filename} is not a snapshot")
+
+        self._rows = rows
+        layout = _layout(rows, genres)
+        self._view = memoryview(self._mmap)
+        self._released = self._column(layout["released"], "i")
+        self._metacritic = self._column(layout["metacritic"], "h")
+        self._genres = self._column(layout["genres"], "Q")
+        self._offsets = self._column(layout["offsets"], "Q")
+        self._strings = layout["strings"][0]
+        self._genre_names = tuple(sys.intern(self._string(2 * rows + i)) for i in range(genres))
+
+    def _column(self, section: tuple[int, int], typecode: str) -> memoryview:
+        offset, size = section
+        return self._view[offset:offset + size].cast(typecode)
+
+    def _string(self, i: int) -> str:
+        return str(self._view[self._strings + self._offsets[i]:self._strings + self._offsets[i + 1]], "utf-8")
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def released(self) -> memoryview:
+        """release dates of every row as days since 0001-01-01 (0: no date)"""
+        return self._released
+
+    @property
+    def metacritic(self) -> memoryview:
+        """metacritic scores of every row (-1: no score)"""
+        return self._metacritic
+
+    @property
+    def genres(self) -> memoryview:
+        """genre masks of every row, bit i is genre_names[i]"""
+        return self._genres
+
+    @property
+    def genre_names(self):
+        return self._genre_names
+
+    def __len__(self):
+        return self._rows
+
+    def name(self, i: int) -> str:
+        return self._string(2 * i)
+
+    def __getitem__(self, i: int) -> Game:
+        if i < 0:
+            i += self._rows
+        if not 0 <= i < self._rows:
+            raise IndexError("snapshot index out of range")
+        mask = self._genres[i]
+        genres = tuple(genre for bit, genre in enumerate(self._genre_names) if mask >> bit & 1)
+        score = self._metacritic[i]
+        return Game(self._string(2 * i), days_to_date(self._released[i]), genres, score if score >= 0 else None, self._string(2 * i + 1) or None)
+
+    def __iter__(self) -> Iterator[Game]:
+        for i in range(self._rows):
+            yield self[i]
+
+    def close(self):
+        # the views must be released before the map can be closed
+        for view in (self._released, self._metacritic, self._genres, self._offsets, self._view):
+            view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def json_to_snapshot(json_filename: str, snapshot_filename: str) -> TransferStats:
+    """converts a favorites JSON file (Favorites.export_json) to a snapshot"""
+    return write_snapshot(snapshot_filename, iter_games(json_filename))
+
+
+def snapshot_to_json(snapshot_filename: str, json_filename: str) -> TransferStats:
+    """converts a snapshot to a favorites JSON file that Favorites.import_json can load"""
+    with Snapshot(snapshot_filename) as snapshot, atomic_write(json_filename, "wb") as f:
+        return export_games(f, snapshot)
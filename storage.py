@@ -0,0 +1,125 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from game import Game
+import json
+import os
+
+_process_umask = None
+
+
+def _umask() -> int:
+    """returns the umask of the process. It can only be read by setting it, so it is read once"""
+    global _process_umask
+    if _process_umask is None:
+        _process_umask = os.umask(0o022)
+        os.umask(_process_umask)
+    return _process_umask
+
+
+@contextmanager
+def atomic_write(filename: str, mode: str = "w"):
+    """
+    opens a temporary file next to filename and moves it over filename when the block ends.
+    If the block raises, filename is left untouched.
+    """
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        # mkstemp creates the file as 0600: keep the permissions of the file replaced, or those of a new file
+        try:
+            permissions = os.stat(filename).st_mode & 0o7777
+        except FileNotFoundError:
+            permissions = 0o666 & ~_umask()
+        os.chmod(tmp, permissions)
+
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class FavoritesJournal:
+    """
+    Append-only JSON lines log of the add/remove operations made on a favorites list since the last export.
+
+    Each operation is one line, so recording it costs one small write instead of rewriting the whole list.
+    A line cut by a crash is ignored when the journal is replayed.
+    """
+    def __init__(self, filename: str, durable: bool = False):
+        """
+        :param filename: journal file. Created if missing
+        :type filename: str
+        :param durable: fsync after every operation. Defaults to ``False``
+        :type durable: bool
+
+        """
+        self._filename = filename
+        self._durable = durable
+        self._operations = 0
+        self._file = open(filename, "a", encoding="utf-8")
+        self._repair()
+
+    def _repair(self):
+        """counts the operations and drops a last line cut by a crash, so new operations start on a new line"""
+        valid = 0
+        with open(self.filename, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                valid += len(line)
+                self._operations += 1
+        self._file.truncate(valid)
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def operations(self):
+        """number of operations in the journal"""
+        return self._operations
+
+    def _append(self, entry: dict):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        if self._durable:
+            os.fsync(self._file.fileno())
+        self._operations += 1
+
+    def append_add(self, game: Game):
+        self._append({"op": "add", "game": game.to_json()})
+
+    def append_remove(self, game: Game):
+        self._append({"op": "remove", "name": game.name, "released": game.released})
+
+    def replay(self) -> Iterator[tuple[str, object]]:
+        """yields ("add", Game) and ("remove", key) operations in order, reading one line at a time"""
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # only the last line can be incomplete
+                    break
+                if entry["op"] == "add":
+                    yield "add", Game.from_json(entry["game"])
+                else:
+                    yield "remove", (entry["name"], entry["released"])
+
+    def truncate(self):
+        """empties the journal, once its operations are saved in the favorites file"""
+        self._file.truncate(0)
+        self._file.flush()
+        self._operations = 0
+
+    def close(self):
+        self._file.close()
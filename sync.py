@@ -0,0 +1,155 @@
+from catalog import CatalogStore
+from datetime import date, timedelta
+from gameinfo import GameInfo
+from typing import NamedTuple
+import time
+
+
+class SyncStats(NamedTuple):
+    """result of the sync of a query: games inserted, updated and unchanged in the catalog"""
+    query: str
+    inserted: int
+    updated: int
+    unchanged: int
+    skipped: bool
+    truncated: bool
+    seconds: float
+
+
+class Synchronizer:
+    """
+    Incremental refresh of genre and date queries into a CatalogStore.
+
+    After each sync a high-water mark is saved in the catalog for the query: the latest ``updated``
+    date of its games, never later than today. The next sync requests only the games of the query
+    updated since that day, most recently updated first. A game changed on the api (new score,
+    new genre) or added late with an old release date is updated after its release, so it is
+    requested again.
+
+    The api serves at most MAX_PAGE pages of a request. When more games than that were updated,
+    the window is narrowed to the games older than the oldest one received and requested again,
+    until every update is in. Only when more games than a request can hold were updated on a
+    single day are some missed: the sync is reported truncated and the mark is left where it was.
+
+    Games deleted from the api are not detected: they stay in the catalog until it is rebuilt
+    with reset().
+
+    Usage example:
+        synchronizer = Synchronizer(GameInfo(), CatalogStore())
+        for stats in synchronizer.sync_all([("genre", "RPG"), ("dates", ("2020-01-01", "2020-12-31"))]):
+            print(stats)
+
+    """
+    def __init__(self, game_info: GameInfo, catalog: CatalogStore):
+        self._game_info = game_info
+        self._catalog = catalog
+        with catalog.connection as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sync_state (query TEXT PRIMARY KEY, updated TEXT NOT NULL, synced REAL NOT NULL)")
+
+    @staticmethod
+    def query_name(spec: tuple) -> str:
+        """returns the name of the high-water mark of a query spec (ie: genre:RPG)"""
+        kind, value = spec
+        return f"{kind}:{','.join(value) if kind == 'dates' else value}"
+
+    def mark(self, spec: tuple) -> str:
+        """returns the high-water mark of a query spec, the day (YYYY-MM-DD) of its latest update, or None if it was never synced"""
+        row = self._catalog.connection.execute("SELECT updated FROM sync_state WHERE query = ?", (self.query_name(spec),)).fetchone()
+        return row[0] if row else None
+
+    def reset(self, spec: tuple):
+        """forgets the high-water mark of a query spec: its next sync downloads everything again"""
+        with self._catalog.connection as db:
+            db.execute("DELETE FROM sync_state WHERE query = ?", (self.query_name(spec),))
+
+    def _payload(self, spec: tuple) -> dict:
+        """returns the payload of a query spec, most recently updated games first"""
+        kind, value = spec
+        if kind == "genre":
+            payload = self._game_info._genre_payload(value)
+        elif kind == "dates":
+            payload = self._game_info._dates_payload(value)
+        else:
+            raise ValueError(f"Invalid query spec: {spec!r}")
+        # updated is not one of the orderings of the search methods, but the api accepts it
+        return {**payload, "ordering": "-updated"}
+
+    @staticmethod
+    def _window(payload: dict, since: str, until: str = None) -> dict:
+        """returns payload restricted to the games updated from the day since to the day until (both included), by default to today"""
+        today = date.today()
+        # the api may date updates in another time zone: the window ends tomorrow
+        until = until or (today + timedelta(days=1)).isoformat()
+        start = min(since, today.isoformat(), until)
+        return {**payload, "updated": f"{start},{until}"}
+
+    def sync(self, spec: tuple) -> SyncStats:
+        """
+        brings the games of a query up to date in the catalog
+
+        :param spec: ("genre", genre) or ("dates", (start, end)), like the specs of GameInfo.batch
+        :type spec: tuple
+        :returns: games inserted, updated and unchanged, whether nothing was updated since the last sync
+            and whether some updates could not be requested
+        :rtype: SyncStats
+
+        """
+        start = time.perf_counter()
+        name = self.query_name(spec)
+        query = self._payload(spec)
+        mark = self.mark(spec)
+
+        # the games updated on the mark's day are requested again: some may have been updated after the last sync
+        payload = self._window(query, mark) if mark else query
+        until = None
+
+        inserted = updated = unchanged = 0
+        latest = mark
+        truncated = False
+        # games of the day a narrowed window ends on are received twice
+        seen = set()
+        while payload:
+            oldest, more = None, False
+            while payload:
+                data = self._game_info._fetch_uncached(payload)
+                results = [game for game in data["results"] if game.get("id") is None or game["id"] not in seen]
+                seen.update(game["id"] for game in results if game.get("id") is not None)
+                stats = self._catalog.upsert(results)
+                inserted += stats.inserted
+                updated += stats.updated
+                unchanged += stats.unchanged
+                days = [game["updated"][:10] for game in data["results"] if game.get("updated")]
+                if days:
+                    latest = max(latest or "", *days)
+                    oldest = min(oldest or days[0], *days)
+                payload = self._game_info._next_payload(payload, data.get("next"))
+                # a next link past MAX_PAGE: the rest of the window can't be requested
+                more = bool(data.get("next")) and payload is None
+
+            if more:
+                if oldest and (until is None or oldest < until):
+                    # the games not received were updated on the oldest day received or before
+                    until = oldest
+                    payload = self._window(query, mark or "1900-01-01", until)
+                else:
+                    truncated = True
+
+        # a mark in the future would make the next window empty
+        if latest and not truncated:
+            self._save_mark(name, min(latest, date.today().isoformat()))
+        skipped = mark is not None and not (inserted or updated or truncated)
+        return SyncStats(name, inserted, updated, unchanged, skipped, truncated, time.perf_counter() - start)
+
+    def sync_all(self, specs: list[tuple]) -> list[SyncStats]:
+        # every spec is validated before the first request
+        for spec in specs:
+            self._payload(spec)
+        return [self.sync(spec) for spec in specs]
+
+    def _save_mark(self, name: str, updated: str):
+        with self._catalog.connection as db:
+            db.execute(
+                "INSERT INTO sync_state (query, updated, synced) VALUES (?, ?, ?) "
+                "ON CONFLICT (query) DO UPDATE SET updated = excluded.updated, synced = excluded.synced",
+                (name, updated, time.time())
+            )
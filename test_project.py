@@ -1,6 +1,26 @@
 import pytest
 from game import Game
+from favorites import Favorites
+from UI import UI, Context
 from project import is_recent, is_high_score, game_to_json
+from gameinfo import GameInfo, APIRequestError, MAX_PAGE
+import threading
+import subprocess
+import os
+import sys
+from cache import ResponseCache
+from asyncgameinfo import AsyncGameInfo
+from ratelimit import TokenBucket
+import time
+import io
+import json
+from jsonstream import iter_json_array
+from benchmark import StubRAWG
+from index import GameIndex
+from gametable import GameTable
+from crawler import Crawler
+from datetime import date
+from metrics import Metrics, PrometheusSink, SummarySink, CSVTraceSink
 
 @pytest.fixture
 def my_game():
@@ -22,4 +42,878 @@ def test_is_high_score(my_game):
 
 
 def test_game_to_json(my_game):
-    assert game_to_json(my_game).get("name") != None
\ No newline at end of file
+    assert game_to_json(my_game).get("name") != None
+
+
+def test_gameinfo_pooled_session():
+    game_info = GameInfo(timeout=(1, 2), retries=5)
+    adapter = game_info._session.get_adapter(game_info.url)
+    assert game_info.timeout == (1, 2)
+    assert adapter.max_retries.total == 5
+    assert 429 in adapter.max_retries.status_forcelist
+    game_info.close()
+
+
+def test_response_cache(tmp_path):
+    filename = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(filename, max_memory_entries=1)
+    payload = {"key": "secret", "genres": "action", "ordering": "-metacritic", "page": 1}
+
+    assert cache.get(payload) is None
+    cache.set(payload, {"count": 1, "results": [{"name": "Half-life 2"}]})
+    cache.set({"genres": "indie", "page": 1}, {"count": 0, "results": []})
+
+    # the api key is not part of the key, and the first entry was evicted from memory but not from disk
+    assert cache.get({**payload, "key": "other", "page": "1"})["count"] == 1
+    assert cache.hits == 1 and cache.misses == 1
+    cache.close()
+
+    # entries survive a restart
+    assert ResponseCache(filename).get(payload)["results"][0]["name"] == "Half-life 2"
+
+
+def test_response_cache_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttls={"search": 0})
+    cache.set({"search": "portal"}, {"results": []})
+    assert cache.get({"search": "portal"}) is None
+
+
+def test_fetch_all_pages_in_page_order():
+    game_info = GameInfo()
+
+    def fake_fetch(payload):
+        # later pages answer first
+        time.sleep(0.01 * (4 - payload["page"]))
+        return {"count": 45, "results": [{"name": f"game {payload['page']}"}]}
+
+    game_info._fetch = fake_fetch
+    client = AsyncGameInfo(game_info, concurrency=4)
+    games = client.fetch_all_pages("search_by_genre", "action")
+    assert [game["name"] for game in games] == ["game 1", "game 2", "game 3"]
+
+    with pytest.raises(ValueError):
+        client.fetch_all_pages("search_by_genre", "not a genre")
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.03
+
+
+def test_iter_genre_follows_next():
+    game_info = GameInfo()
+    requested = []
+
+    def fake_fetch(payload):
+        page = int(payload["page"])
+        requested.append(page)
+        next_url = f"https://api.rawg.io/api/games?genres=action&key=leaked&page={page + 1}" if page < 3 else None
+        game = {"name": f"game {page}", "released": "2004-11-16", "genres": [], "metacritic": 90, "background_image": None}
+        return {"count": 3, "next": next_url, "results": [game]}
+
+    game_info._fetch = fake_fetch
+    games = game_info.iter_genre("action")
+    assert next(games).name == "game 1"
+    assert [game.name for game in games] == ["game 2", "game 3"]
+    assert requested == [1, 2, 3]
+
+
+def test_game_from_api_and_hash(my_game):
+    game = Game.from_api({
+        "name": "Half-life 2",
+        "released": "2004-11-16",
+        "genres": [{"id": 4, "name": "Action"}, {"id": 2, "name": "Shooter"}],
+        "metacritic": 96,
+        "background_image": None
+    })
+    assert game.genres == ("Action", "Shooter")
+    assert game == my_game and hash(game) == hash(my_game)
+    assert len({game, my_game}) == 1
+    assert not hasattr(game, "__dict__")
+
+
+def test_favorites_indexes(my_game):
+    favorites = Favorites()
+    portal = Game("Portal", "2007-10-09", ("Puzzle",), 88, None)
+    favorites.add(my_game)
+    favorites.add(portal)
+
+    with pytest.raises(ValueError):
+        favorites.add(Game("Half-life 2", "2004-11-16", (), None, None))
+
+    assert my_game in favorites and len(favorites) == 2
+    assert favorites.by_genre("shooter") == [my_game]
+    assert favorites.by_year(2007) == [portal]
+    assert favorites.by_metacritic(96) == [my_game]
+
+    # an equal object removes the stored game and its index entries
+    favorites.remove(Game("Half-life 2", "2004-11-16", (), None, None))
+    assert favorites.favorites == [portal]
+    assert favorites.by_genre("shooter") == []
+    with pytest.raises(ValueError):
+        favorites.remove(my_game)
+
+
+def test_favorites_journal(tmp_path, my_game):
+    favorites = Favorites()
+    favorites.filename = str(tmp_path / "favorites.json")
+    favorites.enable_journal(compact_every=3)
+    portal = Game("Portal", "2007-10-09", ("Puzzle",), 90, None)
+
+    favorites.add(my_game)
+    favorites.add(portal)
+    favorites.remove(my_game)
+    # the third operation compacted the journal into the favorites file
+    assert favorites.journal.operations == 0
+
+    favorites.add(my_game)
+    with open(favorites.journal_filename, "a") as f:
+        f.write('{"op": "add", "ga')  # cut by a crash
+
+    restored = Favorites()
+    restored.filename = favorites.filename
+    restored.enable_journal()
+    restored.import_json()
+    assert restored.favorites == [portal, my_game]
+
+    restored.remove(portal)
+    restored.import_json()
+    assert restored.favorites == [my_game]
+
+
+def test_favorites_journal_compacts_without_import(tmp_path):
+    filename = str(tmp_path / "favorites.json")
+    favorites = Favorites()
+    favorites.filename = filename
+    for i in range(5):
+        favorites.add(Game(f"old{i}", "2020-01-01", (), 80, None))
+    favorites.export_json()
+
+    # games added before importing the file are merged into it when the journal is compacted
+    later = Favorites()
+    later.filename = filename
+    later.enable_journal(compact_every=2)
+    later.add(Game("new1", "2021-01-01", (), 80, None))
+    later.add(Game("new2", "2021-01-01", (), 80, None))
+    assert later.journal.operations == 0
+
+    restored = Favorites()
+    restored.filename = filename
+    restored.import_json()
+    assert [game.name for game in restored] == ["old0", "old1", "old2", "old3", "old4", "new1", "new2"]
+
+
+def test_favorites_journal_compacts_into_a_new_filename(tmp_path):
+    other = Favorites()
+    other.filename = str(tmp_path / "b.json")
+    for i in range(3):
+        other.add(Game(f"b{i}", "2020-01-01", (), 80, None))
+    other.export_json()
+
+    # exported to a.json, then switched to b.json: the games of b.json are kept when the journal is compacted
+    favorites = Favorites()
+    favorites.filename = str(tmp_path / "a.json")
+    favorites.add(Game("a0", "2020-01-01", (), 80, None))
+    favorites.export_json()
+    favorites.filename = other.filename
+    favorites.enable_journal(compact_every=1)
+    favorites.add(Game("new", "2021-01-01", (), 80, None))
+
+    restored = Favorites()
+    restored.filename = other.filename
+    restored.import_json()
+    assert [game.name for game in restored] == ["b0", "b1", "b2", "new"]
+
+
+def test_favorites_files_are_utf8_whatever_the_locale(tmp_path):
+    # an ASCII locale, like a Windows code page, can't decode the UTF-8 written by orjson
+    code = """if True:
+        import sys
+        from favorites import Favorites
+        from game import Game
+        favorites = Favorites()
+        favorites.filename = sys.argv[1]
+        favorites.add(Game("Pok\\u00e9mon", "1996-02-27", (), 80, None))
+        favorites.export_json()
+        favorites.enable_journal()
+        favorites.add(Game("\\u014ckami", "2006-04-20", (), 93, None))
+        loaded = Favorites()
+        loaded.filename = sys.argv[1]
+        loaded.enable_journal()
+        loaded.import_json()
+        print(ascii([game.name for game in loaded]))
+    """
+    env = {**os.environ, "LC_ALL": "C", "PYTHONUTF8": "0"}
+    result = subprocess.run([sys.executable, "-X", "utf8=0", "-c", code, str(tmp_path / "favorites.json")], capture_output=True, text=True,
+                            check=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.stdout.strip() == ascii(["Pok\u00e9mon", "\u014ckami"])
+
+
+def test_iter_json_array_small_chunks():
+    items = [{"name": "a, [b]", "genres": ["x"]}, {"name": "c\\"}, {"name": "}"}]
+    f = io.StringIO(" [ " + ", ".join(json.dumps(item) for item in items) + " ] ")
+    assert list(iter_json_array(f, chunk_size=3)) == items
+
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO('[{"name": "a"}'), chunk_size=3))
+
+
+def test_favorites_streaming_round_trip(tmp_path, my_game):
+    favorites = Favorites()
+    favorites.filename = str(tmp_path / "favorites.json")
+    favorites.add(my_game)
+    assert favorites.export_json().games == 1
+
+    (tmp_path / "broken.json").write_text('[{"name": ')
+    favorites.filename = str(tmp_path / "broken.json")
+    with pytest.raises(FileNotFoundError):
+        favorites.import_json()
+    # the loaded favorites are kept when the file is invalid
+    assert favorites.favorites == [my_game]
+
+    favorites.filename = str(tmp_path / "favorites.json")
+    stats = favorites.import_json()
+    assert stats.games == 1 and favorites.favorites[0].genres == ("action", "shooter")
+
+
+def test_stub_rawg_pagination():
+    with StubRAWG(count=45) as stub:
+        game_info = GameInfo(url=stub.url, cache=ResponseCache(":memory:"))
+        assert len(list(game_info.iter_genre("action"))) == 45
+        assert stub.requests == 3
+
+        # a warm cache costs no requests
+        assert len(list(game_info.iter_genre("action"))) == 45
+        assert stub.requests == 3
+        game_info.close()
+
+
+def test_metrics_sinks(tmp_path):
+    registry = Metrics()
+    registry.add_sink(CSVTraceSink(str(tmp_path / "trace.csv")))
+    with registry.timer("request_seconds"):
+        pass
+    registry.incr("responses_total", status=200)
+    registry.incr("responses_total", status=200)
+    registry.close()
+
+    text = PrometheusSink().dump(registry)
+    assert 'responses_total{status="200"} 2' in text
+    assert 'request_seconds_bucket{le="+Inf"} 1' in text
+    assert "request_seconds" in SummarySink().dump(registry)
+    assert len((tmp_path / "trace.csv").read_text().splitlines()) == 4
+
+
+def test_game_index_query(my_game):
+    index = GameIndex.from_games([
+        my_game,
+        Game("The Witcher 3: Wild Hunt", "2015-05-18", ("RPG", "Action"), 92, None),
+        Game("Dragon Age: Inquisition", "2014-11-18", ("RPG",), 85, None),
+        Game("Disco Elysium", "2019-10-15", ("RPG",), 91, None),
+        Game("Half-Life: Alyx", "2020-03-23", ("Action",), 93, None)
+    ])
+
+    rpgs = index.query(genres=["rpg"], released=("2015-01-01", "2020-12-31"), metacritic=(85, 100), order_by="released")
+    assert [game.name for game in rpgs] == ["The Witcher 3: Wild Hunt", "Disco Elysium"]
+    assert [game.name for game in index.search("half")] == ["Half-life 2", "Half-Life: Alyx"]
+    assert [game.name for game in index.search("witchr", fuzzy=True)] == ["The Witcher 3: Wild Hunt"]
+    assert index.query(order_by="-metacritic", limit=1)[0] == my_game
+
+    index.remove(my_game)
+    assert [game.name for game in index.search("half")] == ["Half-Life: Alyx"]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def table_backend(request, monkeypatch):
+    """runs a GameTable test with numpy, if installed, and with the plain loops"""
+    import gametable
+
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(gametable, "np", None)
+    return request.param
+
+
+def test_game_table(my_game, table_backend):
+    table = GameTable.from_games([
+        my_game,
+        Game("Disco Elysium", "2019-10-15", ("RPG",), 91, None),
+        Game("Hades", "2020-09-17", ("action", "RPG"), 93, None),
+        Game("Unscored", None, ("RPG",), None, None)
+    ])
+
+    assert list(table.is_recent(2, today=date(2021, 6, 1))) == [False, True, True, False]
+    assert list(table.is_high_score(92)) == [True, False, True, False]
+    assert list(table.is_recent(2, today=date(2021, 6, 1)) & table.is_high_score(92)) == [False, False, True, False]
+    assert list(table.is_recent(2, today=date(2021, 6, 1)) | ~table.has_genre("action")) == [False, True, True, True]
+    assert list(table.has_genre("no such genre") | table.is_high_score(92)) == [True, False, True, False]
+
+    rpgs = table.filter(table.has_genre("RPG")).sort("-metacritic")
+    assert [game.name for game in rpgs.to_games()] == ["Hades", "Disco Elysium", "Unscored"]
+    assert rpgs.game(0) == Game("Hades", "2020-09-17", (), None, None)
+    assert rpgs.game(0).genres == ("action", "RPG")
+
+    assert table.group_by_genre()["RPG"] == {"count": 3, "mean_metacritic": 92.0}
+    assert table.score_histogram()[9] == 3
+
+    # equal values keep their order in both directions
+    ties = GameTable.from_games([Game(name, "2020-01-01", (), score, None) for name, score in (("a", 80), ("b", 90), ("c", 80))])
+    assert [game.name for game in ties.sort("-metacritic").to_games()] == ["b", "a", "c"]
+    assert [game.name for game in ties.sort("metacritic").to_games()] == ["a", "c", "b"]
+
+
+def test_game_table_empty_results(my_game, table_backend):
+    assert len(GameTable().filter([])) == 0
+    assert len(GameTable().sort("-metacritic")) == 0
+
+    table = GameTable.from_games([my_game])
+    empty = table.filter(table.is_high_score(100)).sort("-metacritic")
+    assert len(empty) == 0 and empty.to_games() == []
+    assert len(empty.released) == 0 and empty.genre_bits == table.genre_bits
+
+
+def test_crawler_resumes(tmp_path):
+    with StubRAWG(count=45) as stub:
+        game_info = GameInfo(url=stub.url)
+        first = Crawler(game_info, str(tmp_path), genres=["action"], workers=1, shard_size=20)
+        assert first.run(progress=lambda message: None).games == 45
+
+        # a new crawl with the same output only fetches the units not done yet
+        second = Crawler(game_info, str(tmp_path), genres=["action", "indie"], workers=1, shard_size=20)
+        assert second.run(progress=lambda message: None).games == 45
+        assert stub.requests == 6
+        game_info.close()
+
+    lines = [line for shard in sorted(tmp_path.glob("part-*.jsonl")) for line in shard.read_text().splitlines()]
+    assert len(lines) == 90
+    assert Game.from_json(json.loads(lines[0])).genres == ("Action", "Shooter")
+
+
+def test_crawler_checkpoints_pages_before_a_failure(tmp_path):
+    with StubRAWG(count=100) as stub:
+        game_info = GameInfo(url=stub.url)
+        get = game_info._get
+
+        def failing_get(payload):
+            if payload["page"] == 4:
+                raise APIRequestError("HTTPError 500", status=500)
+            return get(payload)
+
+        game_info._get = failing_get
+        crawler = Crawler(game_info, str(tmp_path), genres=["action"], workers=1, concurrency=1, shard_size=50)
+        with pytest.raises(APIRequestError):
+            crawler.run(progress=lambda message: None)
+        # the pages fetched before the failure, and the one in flight, are saved
+        with open(crawler.checkpoint_filename) as f:
+            done = set(json.load(f)["units"]["genre:action"]["done"])
+        assert {1, 2, 3} <= done and 4 not in done
+
+        # the resumed crawl only requests the pages missing
+        game_info._get = get
+        requests = stub.requests
+        assert Crawler(game_info, str(tmp_path), genres=["action"], workers=1, shard_size=50).run(progress=lambda message: None).games == 20 * (5 - len(done))
+        assert stub.requests - requests == 5 - len(done)
+        game_info.close()
+
+
+def test_gameinfo_coalesces_and_raises_typed_errors():
+    game_info, other = GameInfo(), GameInfo()
+    assert game_info._limiter is other._limiter
+    calls = []
+    release = threading.Event()
+
+    def slow_fetch(payload):
+        calls.append(payload)
+        release.wait(1)
+        return {"results": [{"name": "Portal"}]}
+
+    game_info._fetch_uncached = slow_fetch
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(game_info._request({"search": "portal"}))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len(results) == 5
+
+    with StubRAWG(count=20) as stub:
+        stub_info = GameInfo(url=stub.url, retries=0)
+        with pytest.raises(APIRequestError) as error:
+            stub_info.search_by_genre("action", page=2)
+        assert error.value.status == 404
+
+
+# cumulative import time allowed to each entry point, in microseconds (python -X importtime)
+IMPORT_BUDGET = {"project": 50_000, "UI": 200_000}
+
+
+def import_time(module: str) -> int:
+    """best of three runs of the cumulative import time of module, in microseconds"""
+    times = []
+    for _ in range(3):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(int(result.stderr.strip().splitlines()[-1].split("|")[1]))
+    return min(times)
+
+
+def test_startup_import_budget():
+    for module, budget in IMPORT_BUDGET.items():
+        assert import_time(module) <= budget, f"import {module} is over its budget"
+
+    # the api client and the browser are only loaded when first needed
+    code = "import project, UI, sys; print(' '.join(sorted(sys.modules)))"
+    modules = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    for heavy in ("requests", "dotenv", "webbrowser", "gameinfo", "sqlite3", "orjson"):
+        assert heavy not in modules
+
+
+def test_ui_paginates_lists(monkeypatch, capsys):
+    ui = UI(Context.FAVORITES)
+    for i in range(45):
+        ui.favorites.add(Game(f"Game {i}", "2020-01-01", (), 80, None))
+    inputs = iter(["n", "25"])
+    monkeypatch.setattr("builtins.input", lambda label="": next(inputs))
+
+    ui.show_context()
+    first_page = capsys.readouterr().out
+    assert "Game 19" in first_page and "Game 20" not in first_page and "page 1/3" in first_page
+
+    ui.show_context()
+    second_page = capsys.readouterr().out
+    assert "Game 39" in second_page and "page 2/3" in second_page
+    assert ui._game_selected.name == "Game 24"
+
+def test_ui_prefetches_next_page(monkeypatch, capsys, tmp_path):
+    from prefetch import ImageCache
+
+    images = []
+    monkeypatch.setattr(ImageCache, "prefetch", lambda self, urls: images.extend(urls))
+    with StubRAWG(count=45) as stub:
+        ui = UI()
+        ui._game_info = GameInfo(url=stub.url)
+        ui._images = ImageCache(str(tmp_path))
+        ui._run_search("search_by_genre", genre="action")
+        assert ui._current_context == Context.GAME_LIST
+
+        # page 2 is requested in background while page 1 is shown
+        ui.prefetcher.submit(ui._search_key(2), ui._search_call(2)).result()
+        assert stub.requests == 2
+
+        inputs = iter(["n"])
+        monkeypatch.setattr("builtins.input", lambda label="": next(inputs))
+        ui.show_context()
+        assert "results... page 1" in capsys.readouterr().out and len(images) == 20
+
+        # the prefetched page is shown and the last one, not full, is prefetched in turn
+        assert ui._search_page == 2 and ui._game_list[0].name == "Game 20"
+        ui.prefetcher.submit(ui._search_key(3), ui._search_call(3)).result()
+        assert stub.requests == 3
+
+        # there is no page after MAX_PAGE to load or to prefetch
+        assert not ui._load_search_page(MAX_PAGE + 1)
+        assert ui._search_page == 2 and stub.requests == 3
+        ui.prefetcher.shutdown()
+
+
+def test_image_cache_evicts_least_recently_used(tmp_path):
+    from prefetch import ImageCache
+
+    sources = []
+    for i in range(3):
+        source = tmp_path / f"image{i}.jpg"
+        source.write_bytes(bytes(100))
+        sources.append(source.as_uri())
+
+    images = ImageCache(str(tmp_path / "cache"), max_bytes=250)
+    first = images.download(sources[0])
+    images.download(sources[1])
+    os.utime(first, (0, 0))
+    images.download(sources[2])
+    assert images.get(sources[0]) is None
+    assert images.get(sources[1]) and images.get(sources[2]).endswith(".jpg")
+    images.shutdown()
+
+
+def test_image_cache_drops_failed_downloads(tmp_path, monkeypatch):
+    import contextlib
+    import urllib.request
+    from prefetch import ImageCache
+
+    class Response(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell():
+                raise ConnectionResetError("connection lost")
+            return super().read(size)
+
+    monkeypatch.setattr(urllib.request, "urlopen", lambda url, timeout: contextlib.closing(Response(bytes(1 << 17))))
+    images = ImageCache(str(tmp_path / "cache"))
+    with pytest.raises(ConnectionResetError):
+        images.download("https://example.com/image.jpg")
+    assert os.listdir(tmp_path / "cache") == []
+
+    # nothing was cached: get reports it missing
+    assert images.get("https://example.com/image.jpg") is None
+    images.shutdown()
+
+
+def test_batch_deduplicates_and_reports_errors():
+    with StubRAWG(count=45) as stub:
+        game_info = GameInfo(url=stub.url)
+        with pytest.raises(ValueError):
+            game_info.batch([("genre", "action"), ("genre", "not a genre")])
+        with pytest.raises(ValueError):
+            game_info.batch([("genre", "action"), ("dates", ["2020-01-01", "2020-12-31"])])
+        assert stub.requests == 0
+
+        specs = [("genre", "action"), ("genre", "action", "-metacritic", 1), ("dates", ("2020-01-01", "2020-12-31")), ("genre", "action", "-metacritic", 50)]
+        batch = game_info.batch(specs)
+        assert stub.requests == 3
+        assert batch.results[specs[0]] is batch.results[specs[1]] and len(batch.results[specs[2]]) == 20
+        assert batch.errors[specs[3]].status == 404 and specs[3] not in batch.results
+
+
+def test_catalog_upsert_query_and_tags(tmp_path):
+    from catalog import CatalogStore
+
+    catalog = CatalogStore(str(tmp_path / "catalog.sqlite"), batch_size=2)
+    results = [
+        {"id": 1, "name": "Half-life 2", "released": "2004-11-16", "genres": [{"name": "Action"}, {"name": "Shooter"}], "metacritic": 96, "background_image": None},
+        {"id": 2, "name": "Portal", "released": "2007-10-09", "genres": [{"name": "Puzzle"}], "metacritic": 90, "background_image": None},
+        {"id": 3, "name": "Doom", "released": None, "genres": [{"name": "Action"}], "metacritic": None, "background_image": None}
+    ]
+    assert catalog.upsert(results) == (3, 0, 0)
+    results[0] = {**results[0], "metacritic": 97}
+    assert catalog.upsert(results) == (0, 1, 2)
+
+    action = catalog.query(genre="action", order_by="-metacritic")
+    assert [game.name for game in action] == ["Half-life 2", "Doom"]
+    assert next(catalog.query(metacritic=(95, 100))).genres == ("Action", "Shooter")
+    assert [game.name for game in catalog.query(released=("2005-01-01", "2010-12-31"))] == ["Portal"]
+
+    # favorites live in the same store as a tagged subset
+    favorites = Favorites()
+    favorites.add(Game("Portal", "2007-10-09", ("Puzzle",), 90, None))
+    favorites.add(Game("Celeste", "2018-01-25", ("Platformer",), 94, None))
+    favorites.export_catalog(catalog)
+    assert len(catalog) == 4
+
+    loaded = Favorites()
+    loaded.import_catalog(CatalogStore(catalog.filename))
+    assert [game.name for game in loaded] == ["Portal", "Celeste"] and loaded.by_genre("Platformer")
+
+
+def test_catalog_keys_games_by_rawg_id(tmp_path):
+    import sqlite3
+    from catalog import CatalogStore
+
+    def game(i, name, released=None):
+        return {"id": i, "name": name, "released": released, "genres": [], "metacritic": None, "background_image": None}
+
+    # a catalog made before games were keyed by their id keeps its rows and tags
+    filename = str(tmp_path / "catalog.sqlite")
+    old = sqlite3.connect(filename)
+    old.executescript("""
+        CREATE TABLE games (id INTEGER PRIMARY KEY, rawg_id INTEGER UNIQUE, name TEXT NOT NULL, released TEXT NOT NULL DEFAULT '',
+            metacritic INTEGER, background_url TEXT, genres TEXT NOT NULL DEFAULT '', updated REAL NOT NULL, UNIQUE (name, released));
+        CREATE TABLE tags (tag TEXT NOT NULL, game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE, position INTEGER NOT NULL,
+            PRIMARY KEY (tag, game_id)) WITHOUT ROWID;
+        INSERT INTO games VALUES (1, NULL, 'Celeste', '2018-01-25', 94, NULL, '', 0);
+        INSERT INTO tags VALUES ('favorites', 1, 1);
+    """)
+    old.close()
+    catalog = CatalogStore(filename)
+    assert [game.name for game in catalog.tagged("favorites")] == ["Celeste"]
+
+    # two RAWG games with the same name and no date are two rows, stable across syncs
+    assert catalog.upsert([game(1, "Doom"), game(2, "Doom")]) == (2, 0, 0)
+    assert catalog.upsert([game(1, "Doom"), game(2, "Doom")]) == (0, 0, 2)
+
+    # a rename onto the name and date of another game doesn't abort the batch
+    assert catalog.upsert([game(3, "Portal", "2007-10-09"), game(4, "Portal 2")]) == (2, 0, 0)
+    assert catalog.upsert([game(4, "Portal", "2007-10-09"), game(5, "Celeste", "2018-01-25")]) == (0, 2, 0)
+    # the game stored without id got it
+    assert len(catalog) == 5 and catalog.connection.execute("SELECT rawg_id FROM games WHERE name = 'Celeste'").fetchone() == (5,)
+
+
+def test_sync_requests_only_updated_games(tmp_path):
+    from catalog import CatalogStore
+    from datetime import timedelta
+    from sync import Synchronizer
+
+    def day(offset):
+        return (date.today() + timedelta(days=offset)).isoformat()
+
+    def game(i, released, updated, metacritic=80):
+        return {"id": i, "name": f"game {i}", "released": released, "genres": [{"name": "RPG"}], "metacritic": metacritic,
+                "background_image": None, "updated": f"{updated}T12:00:00"}
+
+    # game 2 is announced: its release date is in the future
+    api = [game(1, "2020-01-01", day(-30)), game(2, "2029-01-01", day(-20)), game(3, "2020-03-01", day(-10))]
+    payloads = []
+
+    def fetch(payload):
+        payloads.append(payload)
+        start, end = payload.get("updated", "0000,9999").split(",")
+        results = sorted((game for game in api if start <= game["updated"][:10] <= end), key=lambda game: game["updated"], reverse=True)
+        return {"count": len(results), "next": None, "results": results}
+
+    game_info = GameInfo()
+    game_info._fetch_uncached = fetch
+    synchronizer = Synchronizer(game_info, CatalogStore(str(tmp_path / "catalog.sqlite")))
+
+    first = synchronizer.sync(("genre", "RPG"))
+    assert (first.inserted, first.updated, first.unchanged, first.skipped) == (3, 0, 0, False)
+    assert synchronizer.mark(("genre", "RPG")) == day(-10)
+    second = synchronizer.sync(("genre", "RPG"))
+    assert second.skipped and second.unchanged == 1
+
+    # a new score on an old game and an old title added late are both found by their update date
+    api[0] = game(1, "2020-01-01", day(0), metacritic=85)
+    api.append(game(4, "2015-06-01", day(0)))
+    delta = synchronizer.sync(("genre", "RPG"))
+    assert (delta.inserted, delta.updated, delta.unchanged) == (1, 1, 1)
+    window = payloads[-1]["updated"].split(",")
+    assert window[0] == day(-10) and window[0] <= window[1] and payloads[-1]["ordering"] == "-updated"
+
+    # the mark is never later than today, so the next window is never empty
+    api.append(game(5, "2021-01-01", day(3)))
+    synchronizer.sync(("genre", "RPG"))
+    assert synchronizer.mark(("genre", "RPG")) == day(0)
+
+
+def test_sync_narrows_the_window_past_the_last_page(tmp_path, monkeypatch):
+    import gameinfo
+    from catalog import CatalogStore
+    from datetime import timedelta
+    from sync import Synchronizer
+
+    def day(offset):
+        return (date.today() + timedelta(days=offset)).isoformat()
+
+    def game(i, updated, metacritic=80):
+        return {"id": i, "name": f"game {i}", "released": "2020-01-01", "genres": [{"name": "RPG"}], "metacritic": metacritic,
+                "background_image": None, "updated": f"{updated}T12:00:00"}
+
+    # a request serves 2 pages of 20 games
+    monkeypatch.setattr(gameinfo, "MAX_PAGE", 2)
+    api = [game(i, day(-90 + i)) for i in range(90)]
+
+    def fetch(payload):
+        start, end = payload.get("updated", "0000,9999").split(",")
+        results = sorted((game for game in api if start <= game["updated"][:10] <= end), key=lambda game: game["updated"], reverse=True)
+        page = int(payload.get("page", 1))
+        more = len(results) > page * 20
+        return {"count": len(results), "next": f"https://api/games?page={page + 1}" if more else None, "results": results[(page - 1) * 20:page * 20]}
+
+    game_info = GameInfo()
+    game_info._fetch_uncached = fetch
+    catalog = CatalogStore(str(tmp_path / "catalog.sqlite"))
+    synchronizer = Synchronizer(game_info, catalog)
+
+    # the first sync gets every game, not only the 40 most recently updated
+    first = synchronizer.sync(("genre", "RPG"))
+    assert (first.inserted, first.updated, first.truncated) == (90, 0, False)
+    assert synchronizer.mark(("genre", "RPG")) == day(-1)
+
+    # more updates on one day than a request holds: reported, and the mark stays
+    for i in range(50):
+        api[i] = game(i, day(0), metacritic=90)
+    delta = synchronizer.sync(("genre", "RPG"))
+    assert delta.truncated and not delta.skipped and delta.updated == 40
+    assert synchronizer.mark(("genre", "RPG")) == day(-1)
+
+
+def test_decode_page_keeps_only_game_fields():
+    from benchmark import fake_game
+    from jsonstream import decode_page
+
+    page = decode_page(json.dumps({"count": 1, "next": None, "results": [fake_game(7)]}).encode())
+    assert set(page["results"][0]) == {"id", "name", "released", "genres", "metacritic", "background_image", "updated"}
+    assert page["results"][0]["genres"] == ("Action", "Shooter")
+    assert Game.from_api(page["results"][0]).key == ("Game 7", fake_game(7)["released"])
+    with pytest.raises(ValueError):
+        decode_page(b"<html>")
+
+
+def test_snapshot_round_trip(tmp_path):
+    from snapshot import Snapshot, json_to_snapshot, snapshot_to_json
+
+    favorites = Favorites()
+    favorites.filename = str(tmp_path / "favorites.json")
+    favorites.add(Game("Half-life 2", "2004-11-16", ("Action", "Shooter"), 96, "https://media.rawg.io/hl2.jpg"))
+    favorites.add(Game("Pokémon Legends", None, ("RPG",), None, None))
+    favorites.export_json()
+
+    assert json_to_snapshot(favorites.filename, str(tmp_path / "favorites.snap")).games == 2
+    with Snapshot(str(tmp_path / "favorites.snap")) as snapshot:
+        assert len(snapshot) == 2 and snapshot.metacritic[1] == -1
+        assert snapshot[-1].name == "Pokémon Legends" and snapshot[1].released is None
+        assert [game.to_json() for game in snapshot] == [game.to_json() for game in favorites]
+        with pytest.raises(IndexError):
+            snapshot[2]
+
+    snapshot_to_json(str(tmp_path / "favorites.snap"), str(tmp_path / "copy.json"))
+    copy = Favorites()
+    copy.filename = str(tmp_path / "copy.json")
+    copy.import_json()
+    assert copy.favorites == favorites.favorites and copy.by_genre("Shooter")
+
+
+def test_query_planner_stops_early():
+    from query import Query, QueryPlanner
+
+    api = [{"id": i, "name": f"game {i}", "released": f"{2000 + i % 25}-01-01", "genres": [{"name": "Action" if i % 2 else "RPG"}],
+            "metacritic": 50 + i % 50, "background_image": None} for i in range(2000)]
+    pages = []
+
+    def fetch(payload):
+        games = api
+        if "genres" in payload:
+            games = [game for game in games if game["genres"][0]["name"].lower() == payload["genres"].lower()]
+        if "dates" in payload:
+            start, end = payload["dates"].split(",")
+            games = [game for game in games if start <= game["released"] <= end]
+        field = payload["ordering"].lstrip("-")
+        games = sorted(games, key=lambda game: game[field], reverse=payload["ordering"].startswith("-"))
+        size, page = int(payload.get("page_size", 20)), int(payload["page"])
+        if size == 20:
+            pages.append(page)
+        more = page * size < len(games)
+        return {"count": len(games), "next": f"http://localhost/?page={page + 1}" if more else None, "results": games[(page - 1) * size:page * size]}
+
+    game_info = GameInfo()
+    game_info._fetch = fetch
+    planner = QueryPlanner(game_info)
+
+    query = Query(genre="action", released=("2020-01-01", None), order_by="-metacritic", limit=10)
+    result = planner.run(query)
+    expected = sorted((Game.from_api(game) for game in api if game["genres"][0]["name"] == "Action" and game["released"] >= "2020-01-01"), key=lambda game: -game.metacritic)
+    assert [game.metacritic for game in result.games] == [game.metacritic for game in expected[:10]]
+    assert result.plan.server_filter == "released" and result.pages == len(pages) <= 2
+
+    # ordered by the field of a range: stops when the games leave the range
+    pages.clear()
+    result = planner.run(Query(genre="RPG", released=("2005-01-01", None), order_by="-released", limit=None))
+    assert result.plan.server_filter == "genre" and result.plan.count == 1000
+    assert len(result.games) == 800 and all(game.released >= "2005" for game in result.games)
+    assert result.pages == len(pages) == 41
+
+
+def test_server_search_favorites_and_backpressure():
+    import asyncio
+    from server import GameServer
+
+    async def request(port, method, target, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        response = await reader.read()
+        writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(content)
+
+    async def raw_status(port, data):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(data)
+        response = await reader.read()
+        writer.close()
+        return int(response.split()[1])
+
+    async def scenario(stub):
+        server = GameServer(GameInfo(url=stub.url), Favorites(), port=0, concurrency=2)
+        await server.start()
+        port = server.port
+
+        status, page = await request(port, "GET", "/search/genre?genre=action&page=2")
+        assert status == 200 and page["next"] == 3 and page["results"][0]["name"] == "Game 20"
+        assert (await request(port, "GET", "/search/genre?genre=nope"))[0] == 400
+
+        game = json.dumps({"name": "Portal", "released": "2007-10-09", "genres": ["Puzzle"], "metacritic": 90, "background_url": None}).encode()
+        assert (await request(port, "POST", "/favorites", game))[0] == 201
+        assert (await request(port, "POST", "/favorites", game))[0] == 409
+        status, listed = await request(port, "GET", "/favorites")
+        assert listed["count"] == 1 and listed["results"][0]["genres"] == ["Puzzle"]
+        assert (await request(port, "DELETE", "/favorites?name=Portal&released=2007-10-09"))[0] == 200
+        assert (await request(port, "DELETE", "/favorites?name=Portal&released=2007-10-09"))[0] == 404
+
+        # with every slot taken, requests are rejected instead of queued
+        for _ in range(2):
+            await server._slots.acquire()
+        assert (await request(port, "GET", "/favorites"))[0] == 503
+        server._slots.release()
+        server._slots.release()
+
+        # malformed requests are answered with an error, not dropped
+        assert await raw_status(port, b"GET /favorites HTTP/1.1\r\nContent-Length: many\r\n\r\n") == 400
+        assert await raw_status(port, b"GET /favorites HTTP/1.1\r\nX-Big: " + b"a" * (1 << 17) + b"\r\n\r\n") == 431
+        assert await raw_status(port, b"GET /favorites HTTP/1.1\r\n" + b"X-Many: a\r\n" * 7000 + b"\r\n") == 431
+
+        status, stats = await request(port, "GET", "/stats")
+        assert stats["GET /search/genre"]["count"] == 2 and "p95_ms" in stats["POST /favorites"]
+        await server.close()
+
+    with StubRAWG(count=45) as stub:
+        asyncio.run(scenario(stub))
+
+
+@pytest.mark.parametrize("memory_limit", [1 << 30, 0])
+def test_set_operations(tmp_path, memory_limit):
+    from setops import set_operation
+
+    files = []
+    for name, games in (("a", [1, 2, 3, 4]), ("b", [3, 4, 5]), ("c", [4, 3, 6])):
+        favorites = Favorites()
+        favorites.filename = str(tmp_path / f"{name}.json")
+        for i in games:
+            favorites.add(Game(f"game {i}", "2020-01-01" if i != 4 else None, (), 80, None))
+        favorites.export_json()
+        files.append(favorites.filename)
+
+    def run(operation):
+        output = str(tmp_path / "out.json")
+        stats = set_operation(operation, files, output, memory_limit=memory_limit, directory=str(tmp_path), run_size=2)
+        result = Favorites()
+        result.filename = output
+        result.import_json()
+        assert stats.games == len(result)
+        return sorted(game.name for game in result)
+
+    assert run("union") == [f"game {i}" for i in range(1, 7)]
+    assert run("intersection") == ["game 3", "game 4"]
+    assert run("difference") == ["game 1", "game 2"]
+    assert not [path for path in os.listdir(tmp_path) if path.startswith("setops-")]
+
+
+@pytest.mark.parametrize("memory_limit", [1 << 30, 0])
+def test_set_operations_keep_missing_and_empty_dates_apart(tmp_path, memory_limit):
+    from setops import set_operation
+
+    # Game.key tells a game without release date from one with an empty date
+    filename = str(tmp_path / "a.json")
+    with open(filename, "w") as f:
+        json.dump([Game("Portal", released, (), 90, None).to_json() for released in (None, "", "2007-10-09")], f)
+
+    output = str(tmp_path / "out.json")
+    assert set_operation("union", [filename], output, memory_limit=memory_limit, directory=str(tmp_path)).games == 3
+    assert set_operation("intersection", [filename, filename], output, memory_limit=memory_limit, directory=str(tmp_path)).games == 3
+    assert set_operation("difference", [filename, filename], output, memory_limit=memory_limit, directory=str(tmp_path)).games == 0
+
+
+@pytest.mark.skipif(os.name != "posix", reason="unix permissions")
+def test_atomic_write_keeps_permissions(tmp_path):
+    from storage import atomic_write, _umask
+
+    filename = str(tmp_path / "favorites.json")
+    with atomic_write(filename) as f:
+        f.write("[]")
+    assert os.stat(filename).st_mode & 0o777 == 0o666 & ~_umask()
+
+    os.chmod(filename, 0o664)
+    with atomic_write(filename) as f:
+        f.write("[]")
+    assert os.stat(filename).st_mode & 0o777 == 0o664